@@ -4,58 +4,129 @@ Provides standardized interface and common functionality for all preview viewers
 """
 
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QSplitter, QTextBrowser
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, QObject, QEvent, QMetaObject, Q_ARG, QAbstractEventDispatcher, pyqtSignal
+from functools import lru_cache
+import time
+from string import Template
 
+# Minimum spacing between live preview renders (one frame at 60 Hz)
+THROTTLE_INTERVAL_MS = 16
 
-class BasePreviewViewer(QTextBrowser):
-    """
-    Abstract base class for preview viewers.
-    Provides common interface and styling functionality.
-    """
-    
-    def __init__(self, colors):
-        super().__init__()
-        self.colors = colors
-        self.setOpenExternalLinks(True)
-        self.setup_base_style()
-        self.setup_custom_style()
-    
-    def setup_base_style(self):
-        """Apply common base styling to all viewers"""
-        base_style = f"""
-            QTextBrowser {{
+# Upper bound for the adaptive throttle interval; renders are spaced at four
+# times their own duration so slow documents cannot saturate the GUI thread
+MAX_ADAPTIVE_DELAY_MS = 1000
+
+# A live render slower than this suspends live preview (seconds)
+FREEZE_THRESHOLD_S = 1.5
+
+_BASE_STYLE = Template("""
+            QTextBrowser {
                 font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Helvetica, Arial, sans-serif;
                 font-size: 14px;
                 line-height: 1.6;
-                color: {self.colors["white"]};
-                background-color: {self.colors["black"]};
+                color: $white;
+                background-color: $black;
                 border: none;
                 padding: 20px;
-            }}
+            }
             
-            QScrollBar:vertical {{
-                background: {self.colors["black"]};
+            QScrollBar:vertical {
+                background: $black;
                 width: 14px;
                 border: none;
-            }}
+            }
             
-            QScrollBar::handle:vertical {{
-                background: {self.colors["gray3"]};
+            QScrollBar::handle:vertical {
+                background: $gray3;
                 min-height: 30px;
                 border: none;
-            }}
+            }
             
-            QScrollBar::handle:vertical:hover {{
-                background: {self.colors["gray4"]};
-            }}
+            QScrollBar::handle:vertical:hover {
+                background: $gray4;
+            }
             
             QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical,
-            QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {{
+            QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {
                 background: none;
                 border: none;
-            }}
-        """
-        self.setStyleSheet(base_style)
+            }
+        """)
+
+
+def palette_key(colors):
+    """Hashable key for a colour palette, used to cache per-palette strings"""
+    return tuple(sorted(colors.items()))
+
+
+@lru_cache(maxsize=4)
+def _base_stylesheet(colors_key):
+    """Common viewer stylesheet, built once per palette"""
+    return _BASE_STYLE.substitute(dict(colors_key))
+
+
+class PreviewThrottler(QObject):
+    """
+    Leading + trailing edge throttler (after KDToolBox's KDSignalThrottler).
+    The first call fires immediately, further calls within the interval are
+    coalesced into a single trailing emission.
+    """
+    
+    triggered = pyqtSignal()
+    
+    def __init__(self, timeout=THROTTLE_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self._pending = False
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.setInterval(timeout)
+        self._timer.timeout.connect(self._on_timeout)
+    
+    def timeout(self):
+        """Current throttle interval in milliseconds"""
+        return self._timer.interval()
+    
+    def set_timeout(self, timeout_ms):
+        """Change the throttle interval"""
+        self._timer.setInterval(timeout_ms)
+    
+    def throttle(self):
+        """Request an emission, respecting the throttle interval"""
+        if self._timer.isActive():
+            self._pending = True
+        else:
+            self.triggered.emit()
+            self._timer.start()
+    
+    def cancel(self):
+        """Drop any pending trailing emission"""
+        self._pending = False
+        self._timer.stop()
+    
+    def _on_timeout(self):
+        if self._pending:
+            self._pending = False
+            self.triggered.emit()
+            self._timer.start()
+
+
+class BasePreviewViewer(QTextBrowser):
+    """
+    Abstract base class for preview viewers.
+    Provides common interface and styling functionality.
+    """
+    
+    def __init__(self, colors):
+        super().__init__()
+        self.colors = colors
+        self.setOpenExternalLinks(True)
+        self.setup_base_style()
+        self.setup_custom_style()
+    
+    def setup_base_style(self):
+        """Apply common base styling to all viewers"""
+        self.setStyleSheet(_base_stylesheet(palette_key(self.colors)))
     
     def setup_custom_style(self):
         """Setup viewer-specific CSS styling - must be implemented by subclasses"""
@@ -88,8 +159,15 @@ class BasePreviewViewer(QTextBrowser):
         
         update_func()
         
-        # Restore scroll position after a small delay
-        QTimer.singleShot(10, lambda: scrollbar.setValue(scroll_pos))
+        # setHtml lays the document out synchronously, so restore right away
+        if scroll_pos <= scrollbar.maximum():
+            scrollbar.setValue(scroll_pos)
+        else:
+            # Range not final yet (e.g. images still sizing) - restore once
+            # the event loop has processed the pending layout
+            QMetaObject.invokeMethod(
+                scrollbar, "setValue", Qt.ConnectionType.QueuedConnection, Q_ARG(int, scroll_pos)
+            )
 
 
 class BasePreviewWidget(QWidget):
@@ -98,6 +176,14 @@ class BasePreviewWidget(QWidget):
     Provides common layout and behavior for all preview types.
     """
     
+    # Emitted when a render was too slow and live preview was switched off
+    live_preview_suspended = pyqtSignal()
+    
+    # Set by widgets whose viewer finishes renders off the GUI thread; such
+    # viewers report each render's real cost through a render_finished(float)
+    # signal instead of being timed around _render_preview
+    viewer_reports_render_time = False
+    
     def __init__(self, text_edit, colors, viewer_class):
         super().__init__()
         self.text_edit = text_edit
@@ -105,14 +191,24 @@ class BasePreviewWidget(QWidget):
         self.viewer_class = viewer_class
         
         # Common settings
-        self.update_delay = 300  # milliseconds
+        self.update_delay = THROTTLE_INTERVAL_MS  # minimum throttle interval, milliseconds
+        self._last_render_ms = 0.0
         self.preview_visible = False
         self.live_preview_enabled = True
+        self._last_text_hash = None
+        self._text_dirty = True
+        self._idle_scheduled = False
+        # Set when a render was skipped because the viewer had no visible area
+        self._update_deferred = False
+        self._deferred_force = False
         
-        # Debounce timer for live preview
-        self.update_timer = QTimer()
-        self.update_timer.setSingleShot(True)
-        self.update_timer.timeout.connect(self._do_update_preview)
+        # Editor connections, only held while the preview is shown
+        self._text_conn = None  # live preview textChanged connection
+        self._contents_conn = None  # edit tracking contentsChange connection
+        
+        # Throttler for live preview; renders wait for the event loop to go idle
+        self.update_throttler = PreviewThrottler(self.update_delay, self)
+        self.update_throttler.triggered.connect(self._schedule_idle_update)
         
         self.setup_ui()
     
@@ -129,6 +225,9 @@ class BasePreviewWidget(QWidget):
         
         # Create and add viewer
         self.viewer = self.viewer_class(self.colors)
+        self.viewer.installEventFilter(self)
+        if self.viewer_reports_render_time:
+            self.viewer.render_finished.connect(self._record_render_time)
         self.splitter.addWidget(self.viewer)
         
         # Set initial sizes (50/50 split)
@@ -153,50 +252,144 @@ class BasePreviewWidget(QWidget):
     def toggle_preview(self):
         """Toggle the preview visibility"""
         self.preview_visible = not self.preview_visible
-        self.viewer.setVisible(self.preview_visible)
         
-        if self.preview_visible:
-            # Update preview with current text
-            self.update_preview()
-            # Set reasonable split sizes
-            total_width = self.splitter.width()
-            self.splitter.setSizes([total_width // 2, total_width // 2])
+        # Batch the resize, show and render into a single repaint
+        self.setUpdatesEnabled(False)
+        try:
+            if self.preview_visible:
+                # Track edits so an unchanged document is never copied out of Qt
+                if self._contents_conn is None:
+                    self._contents_conn = self.text_edit.document().contentsChange.connect(self._on_contents_change)
+                # Edits made while hidden were not tracked
+                self._text_dirty = True
+                if self.live_preview_enabled:
+                    self._connect_text()
+                # Size first so showing the viewer needs one geometry pass
+                total_width = self.splitter.width()
+                self.splitter.setSizes([total_width // 2, total_width // 2])
+                self.viewer.setVisible(True)
+                # Update preview with current text
+                self.update_preview()
+            else:
+                self.viewer.setVisible(False)
+                # Nothing to render while hidden - stop listening to the editor
+                self._disconnect_text()
+                if self._contents_conn is not None:
+                    self.text_edit.document().contentsChange.disconnect(self._contents_conn)
+                    self._contents_conn = None
+        finally:
+            self.setUpdatesEnabled(True)
+            self.update()
         
         return self.preview_visible
     
     def update_preview(self):
-        """Update the preview with debouncing for performance"""
+        """Update the preview with throttling for performance"""
         if self.preview_visible:
             if self.live_preview_enabled:
-                # Cancel any pending update and start timer
-                self.update_timer.stop()
-                self.update_timer.start(self.update_delay)
+                self.update_throttler.throttle()
             else:
                 # Immediate update when not in live mode
                 self._do_update_preview()
     
-    def _do_update_preview(self):
-        """Actually perform the preview update"""
-        self.viewer.update_content(self.text_edit.toPlainText())
+    def _on_contents_change(self, position, chars_removed, chars_added):
+        """Mark the document as edited since the last render"""
+        self._text_dirty = True
+    
+    def _schedule_idle_update(self):
+        """Render once pending input and paint events have been processed"""
+        if self._idle_scheduled:
+            return
+        dispatcher = QAbstractEventDispatcher.instance()
+        if dispatcher is None:
+            self._do_update_preview()
+            return
+        self._idle_scheduled = True
+        dispatcher.aboutToBlock.connect(self._on_event_loop_idle)
+    
+    def _cancel_idle_update(self):
+        """Drop a render waiting for the event loop to go idle"""
+        if self._idle_scheduled:
+            self._idle_scheduled = False
+            QAbstractEventDispatcher.instance().aboutToBlock.disconnect(self._on_event_loop_idle)
+    
+    def _on_event_loop_idle(self):
+        """The event loop is about to wait for events - run the queued render"""
+        self._cancel_idle_update()
+        force = self._deferred_force
+        self._update_deferred = self._deferred_force = False
+        self._do_update_preview(force)
+    
+    def eventFilter(self, obj, event):
+        """Run a render that was skipped once the viewer gets screen space again"""
+        if (obj is self.viewer and self._update_deferred
+                and event.type() in (QEvent.Type.Show, QEvent.Type.Resize)):
+            self._schedule_idle_update()
+        return super().eventFilter(obj, event)
+    
+    def _do_update_preview(self, force=False):
+        """Actually perform the preview update, skipping unchanged text"""
+        if not (self._text_dirty or force):
+            return
+        
+        # Collapsed splitter or hidden viewer - nothing would be seen
+        if not self.viewer.isVisible() or self.viewer.visibleRegion().isEmpty():
+            self._update_deferred = True
+            self._deferred_force = self._deferred_force or force
+            return
+        self._text_dirty = False
+        
+        text = self.text_edit.toPlainText()
+        text_hash = hash(text)
+        if text_hash == self._last_text_hash and not force:
+            return
+        self._last_text_hash = text_hash
+        
+        start = time.perf_counter()
+        self._render_preview(text, force)
+        if not self.viewer_reports_render_time:
+            self._record_render_time(time.perf_counter() - start)
+    
+    def _record_render_time(self, elapsed):
+        """Adapt the throttle to a finished render that took elapsed seconds"""
+        # Space live renders by how long this one took
+        self._last_render_ms = elapsed * 1000
+        self.update_throttler.set_timeout(
+            max(self.update_delay, min(MAX_ADAPTIVE_DELAY_MS, int(4 * self._last_render_ms)))
+        )
+        
+        # Freeze guard: stop rendering on every keystroke if it stalls the editor
+        if self.live_preview_enabled and elapsed > FREEZE_THRESHOLD_S:
+            self.set_live_preview(False)
+            self.live_preview_suspended.emit()
+    
+    def _render_preview(self, text, force=False):
+        """Hand the text to the viewer - override for viewers with a custom method"""
+        self.viewer.update_content(text)
+    
+    def _connect_text(self):
+        """Render on editor changes"""
+        if self._text_conn is None:
+            self._text_conn = self.text_edit.textChanged.connect(self.update_preview)
+    
+    def _disconnect_text(self):
+        """Stop rendering on editor changes and drop any pending update"""
+        if self._text_conn is not None:
+            self.text_edit.textChanged.disconnect(self._text_conn)
+            self._text_conn = None
+        self.update_throttler.cancel()
+        self._cancel_idle_update()
     
     def set_live_preview(self, enabled):
         """Enable/disable live preview updates"""
         self.live_preview_enabled = enabled
         
         if enabled and self.preview_visible:
-            try:
-                self.text_edit.textChanged.disconnect(self.update_preview)
-            except TypeError:
-                pass  # Not connected
-            self.text_edit.textChanged.connect(self.update_preview)
+            self._connect_text()
         else:
-            try:
-                self.text_edit.textChanged.disconnect(self.update_preview)
-            except TypeError:
-                pass  # Not connected
-            # Cancel any pending updates
-            self.update_timer.stop()
+            self._disconnect_text()
     
     def set_update_delay(self, delay_ms):
-        """Set the debounce delay for live preview updates"""
-        self.update_delay = delay_ms
\ No newline at end of file
+        """Set the minimum throttle interval for live preview updates"""
+        self.update_delay = delay_ms
+        self.update_throttler.set_timeout(delay_ms)
\ No newline at end of file
@@ -3,300 +3,522 @@ HTML Viewer module for Notepad--
 Provides live HTML preview functionality using QWebEngineView.
 """
 
-from PyQt6.QtCore import QTimer, QUrl, Qt
-from PyQt6.QtWebEngineWidgets import QWebEngineView
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QSplitter
-import html
-import tempfile
+import sys
 import os
-from components.base_preview_viewer import BasePreviewWidget
-
-class HTMLViewer(QWebEngineView):
-    """
-    A QWebEngineView that renders HTML content with full CSS and JavaScript support.
-    """
-    def __init__(self, colors):
-        super().__init__()
-        self.colors = colors
-        self.temp_file = None
-        self.setup_styling()
 
-    def setup_styling(self):
-        """
-        Apply styling to the web engine view.
-        """
-        # Web engine view styling
-        self.setStyleSheet(f"""
-            QWebEngineView {{
-                background-color: {self.colors["black"]};
-                border: none;
-            }}
-        """)
+# Qt's default GL compositor makes QtWebEngine lag badly on Windows.
+# Chromium reads these flags when the first web view is created, so they
+# must be in place before then; setdefault keeps any user override.
+if sys.platform == 'win32':
+    os.environ.setdefault(
+        "QTWEBENGINE_CHROMIUM_FLAGS",
+        "--disable-gpu-compositing --enable-gpu-rasterization --ignore-gpu-blocklist --enable-zero-copy"
+    )
 
-    def update_content(self, html_text: str):
-        """
-        Updates the viewer with new HTML content by creating a temporary file.
-        """
-        if not html_text.strip():
-            self.show_empty_message("HTML")
-            return
+from PyQt6.QtCore import QUrl, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtWebEngineWidgets import QWebEngineView
+from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineProfile, QWebEngineScript, QWebEngineSettings
+from PyQt6.QtWidgets import QApplication
+import html
+import json
+import re
+import tempfile
+import time
+from functools import lru_cache
+from string import Template
+from components.base_preview_viewer import BasePreviewWidget, palette_key
 
-        try:
-            # Clean up previous temp file
-            if self.temp_file and os.path.exists(self.temp_file):
-                os.unlink(self.temp_file)
-            
-            # Create new temporary file
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as f:
-                # Add dark theme CSS if the HTML doesn't contain a complete document
-                if not html_text.strip().lower().startswith('<!doctype') and '<html' not in html_text.lower():
-                    enhanced_html = self._wrap_with_dark_theme(html_text)
-                    f.write(enhanced_html)
-                else:
-                    f.write(html_text)
-                self.temp_file = f.name
-            
-            # Load the temporary file
-            self.load(QUrl.fromLocalFile(self.temp_file))
-            
-        except Exception as e:
-            self.show_error(html.escape(str(e)), "HTML Rendering Error")
-    
-    def _wrap_with_dark_theme(self, html_content: str) -> str:
-        """
-        Wraps HTML content with a complete document structure and dark theme.
-        """
-        return f"""
+# Page templates; palette colours are filled in once per palette, the
+# remaining placeholders on every render
+_DARK_THEME_HTML = Template("""
         <!DOCTYPE html>
         <html>
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
             <style>
-                body {{
+                body {
                     font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Helvetica, Arial, sans-serif;
                     font-size: 14px;
                     line-height: 1.6;
-                    color: {self.colors["white"]};
-                    background-color: {self.colors["black"]};
+                    color: $white;
+                    background-color: $black;
                     margin: 20px;
                     padding: 0;
-                }}
-                a {{
-                    color: {self.colors["blue"]};
+                }
+                a {
+                    color: $blue;
                     text-decoration: none;
-                }}
-                a:hover {{
+                }
+                a:hover {
                     text-decoration: underline;
-                }}
-                pre, code {{
+                }
+                pre, code {
                     font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
-                    background-color: {self.colors["gray2"]};
-                    color: {self.colors["green"]};
+                    background-color: $gray2;
+                    color: $green;
                     padding: 2px 4px;
                     border-radius: 2px;
                     font-size: 0.9em;
-                }}
-                pre {{
+                }
+                pre {
                     padding: 16px;
                     overflow-x: auto;
-                }}
-                h1, h2, h3, h4, h5, h6 {{
-                    color: {self.colors["white"]};
-                }}
-                table {{
+                }
+                h1, h2, h3, h4, h5, h6 {
+                    color: $white;
+                }
+                table {
                     border-collapse: collapse;
                     width: 100%;
-                }}
-                th, td {{
-                    border: 1px solid {self.colors["gray3"]};
+                }
+                th, td {
+                    border: 1px solid $gray3;
                     padding: 8px;
                     text-align: left;
-                }}
-                th {{
-                    background-color: {self.colors["gray2"]};
-                }}
+                }
+                th {
+                    background-color: $gray2;
+                }
             </style>
         </head>
         <body>
-            {html_content}
+            <div id="np-root">$$content</div>
         </body>
         </html>
-        """
-    
-    def show_empty_message(self, file_type: str):
-        """
-        Show standardized empty state message.
-        """
-        message_html = f"""
+        """)
+
+_EMPTY_HTML = Template("""
         <!DOCTYPE html>
         <html>
         <head>
             <meta charset="UTF-8">
             <style>
-                body {{
+                body {
                     font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Helvetica, Arial, sans-serif;
                     color: #858585;
-                    background-color: {self.colors["black"]};
+                    background-color: $black;
                     margin: 20px;
                     text-align: center;
                     padding-top: 50px;
-                }}
+                }
             </style>
         </head>
         <body>
-            <p>Start typing {file_type} to see the preview...</p>
+            <p>Start typing $${file_type} to see the preview...</p>
         </body>
         </html>
-        """
-        self.setHtml(message_html)
-    
-    def show_error(self, error_message: str, error_type: str = "Error"):
-        """
-        Show standardized error message.
-        """
-        error_html = f"""
+        """)
+
+_ERROR_HTML = Template("""
         <!DOCTYPE html>
         <html>
         <head>
             <meta charset="UTF-8">
             <style>
-                body {{
+                body {
                     font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Helvetica, Arial, sans-serif;
-                    background-color: {self.colors["black"]};
+                    background-color: $black;
                     margin: 20px;
-                    color: {self.colors["white"]};
-                }}
-                .error {{
-                    color: {self.colors["red"]};
+                    color: $white;
+                }
+                .error {
+                    color: $red;
                     background-color: rgba(244, 135, 113, 0.1);
                     padding: 10px;
                     border-radius: 2px;
-                }}
+                }
             </style>
         </head>
         <body>
             <div class="error">
-                <h3>⚠ {error_type}</h3>
-                <p>{error_message}</p>
+                <h3>⚠ $$error_type</h3>
+                <p>$$error_message</p>
             </div>
         </body>
         </html>
-        """
-        self.setHtml(error_html)
+        """)
+
+# Replaces the content root of the loaded shell; evaluates to false when the
+# root is missing so the caller can fall back to a full load
+_PATCH_ROOT_JS = """(function (html) {
+    var root = document.getElementById('np-root');
+    if (!root) { return false; }
+    root.innerHTML = html;
+    return true;
+})(%s);"""
+
+# A complete document declares itself near the top; only this much is scanned
+_FULL_DOCUMENT_RE = re.compile(r'<!doctype|<html', re.IGNORECASE)
+_FULL_DOCUMENT_SCAN = 1024
+
+# Documents shorter than this are handed to Chromium with setHtml() instead
+# of going through the temporary file (setHtml is capped at 2 MB)
+SET_HTML_LIMIT = 262144
+
+# Page features that a static preview does not need; set_full_features()
+# turns them back on for documents that rely on them
+_OPTIONAL_FEATURES = (
+    QWebEngineSettings.WebAttribute.JavascriptEnabled,
+    QWebEngineSettings.WebAttribute.PluginsEnabled,
+    QWebEngineSettings.WebAttribute.WebGLEnabled,
+)
+
+# Web profile shared by every HTML viewer so they reuse one disk cache
+_shared_profile = None
+
+
+def _preview_profile():
+    """Return the shared preview profile, creating it on first use"""
+    global _shared_profile
+    if _shared_profile is None:
+        profile = QWebEngineProfile("notepadmm-preview", QApplication.instance())
+        profile.setCachePath(os.path.join(tempfile.gettempdir(), "notepadmm-webcache"))
+        profile.setHttpCacheType(QWebEngineProfile.HttpCacheType.DiskHttpCache)
+        profile.setHttpCacheMaximumSize(200 * 1024 * 1024)
+        profile.setPersistentCookiesPolicy(QWebEngineProfile.PersistentCookiesPolicy.NoPersistentCookies)
+        _shared_profile = profile
+    return _shared_profile
+
+
+@lru_cache(maxsize=4)
+def _dark_theme_template(colors_key):
+    """Dark theme shell for a palette, leaving only $content to fill in"""
+    return Template(_DARK_THEME_HTML.substitute(dict(colors_key)))
+
+
+@lru_cache(maxsize=4)
+def _empty_html_template(colors_key):
+    """Empty state page for a palette, leaving only $file_type to fill in"""
+    return Template(_EMPTY_HTML.substitute(dict(colors_key)))
+
+
+@lru_cache(maxsize=4)
+def _error_html_template(colors_key):
+    """Error page for a palette, leaving $error_type and $error_message to fill in"""
+    return Template(_ERROR_HTML.substitute(dict(colors_key)))
+
+
+class HTMLAssemblerSignals(QObject):
+    """
+    Signals for HTMLAssembler; QRunnable itself cannot emit signals.
+    """
+    finished = pyqtSignal(int, float)  # generation, seconds
+    failed = pyqtSignal(int, str)
+
+
+class HTMLAssembler(QRunnable):
+    """
+    Wraps an HTML fragment in the page shell and writes it to the viewer's
+    temporary file on a pool thread, keeping large documents off the GUI thread.
+    """
+    def __init__(self, html_text: str, template, path: str, generation: int):
+        super().__init__()
+        self.html_text = html_text
+        self.template = template
+        self.path = path
+        self.generation = generation
+        self.signals = HTMLAssemblerSignals()
     
-    def __del__(self):
-        """
-        Clean up temporary file when the viewer is destroyed.
-        """
-        if hasattr(self, 'temp_file') and self.temp_file and os.path.exists(self.temp_file):
-            try:
-                os.unlink(self.temp_file)
-            except:
-                pass
+    def run(self):
+        start = time.perf_counter()
+        try:
+            if self.template is not None:
+                document_html = self.template.substitute(content=self.html_text)
+            else:
+                document_html = self.html_text
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(document_html)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+        else:
+            self.signals.finished.emit(self.generation, time.perf_counter() - start)
 
-class HTMLPreviewWidget(QWidget):
+
+class HTMLViewer(QWebEngineView):
     """
-    A widget that combines the text editor and the HTML viewer in a splitter.
+    A QWebEngineView that renders HTML content with full CSS support.
+    JavaScript, plugins and WebGL can be enabled with set_full_features().
     """
-    def __init__(self, text_edit, colors):
+    # Seconds an update cost, including any document written on a pool thread
+    render_finished = pyqtSignal(float)
+    
+    def __init__(self, colors):
         super().__init__()
-        self.text_edit = text_edit
         self.colors = colors
+        self._colors_key = palette_key(colors)
         
-        # Common settings
-        self.update_delay = 300  # milliseconds
-        self.preview_visible = False
-        self.live_preview_enabled = True
-        
-        # Debounce timer for live preview
-        self.update_timer = QTimer()
-        self.update_timer.setSingleShot(True)
-        self.update_timer.timeout.connect(self._do_update_preview)
-        
-        self.setup_ui()
-    
-    def setup_ui(self):
-        """Setup UI layout with splitter"""
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(0, 0, 0, 0)
+        # Use the shared profile so linked CSS/JS/images stay cached across reloads
+        self.setPage(QWebEnginePage(_preview_profile(), self))
         
-        # Create splitter
-        self.splitter = QSplitter(Qt.Orientation.Horizontal)
+        # One temp file per viewer, rewritten in place so the page URL stays stable
+        fd, self.temp_file = tempfile.mkstemp(suffix='.html')
+        os.close(fd)
+        self._url = QUrl.fromLocalFile(self.temp_file)
+        self._url_loaded = False
         
-        # Add text editor to splitter
-        self.splitter.addWidget(self.text_edit)
+        # Incremental update state: once the dark-theme shell is loaded,
+        # later edits only replace the body instead of reloading the page
+        self._last_hash = None
+        self._loaded_shell = False
+        self._shell_loading = False
+        self._pending_body = None
+        self.loadFinished.connect(self._on_load_finished)
         
-        # Create and add viewer
-        self.viewer = HTMLViewer(self.colors)
-        self.splitter.addWidget(self.viewer)
+        # Documents are assembled on a pool thread, one job at a time; a
+        # newer document waiting behind the running job replaces older ones
+        self._assembler = None
+        self._queued_document = None
+        self._generation = 0
         
-        # Set initial sizes (50/50 split)
-        self.splitter.setSizes([400, 400])
+        settings = self.settings()
+        settings.setAttribute(QWebEngineSettings.WebAttribute.Accelerated2dCanvasEnabled, True)
+        settings.setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessRemoteUrls, False)
+        self._current_html = ""
+        self.set_full_features(False)
         
-        # Apply splitter styling
-        self.splitter.setStyleSheet(f"""
-            QSplitter::handle {{
-                background-color: {self.colors["gray3"]};
-                width: 1px;
-            }}
-            QSplitter::handle:hover {{
-                background-color: {self.colors["blue"]};
+        self.setup_styling()
+
+    def setup_styling(self):
+        """
+        Apply styling to the web engine view.
+        """
+        # Web engine view styling
+        self.setStyleSheet(f"""
+            QWebEngineView {{
+                background-color: {self.colors["black"]};
+                border: none;
             }}
         """)
+
+    def update_content(self, html_text: str, force: bool = False):
+        """
+        Updates the viewer with new HTML content.
         
-        layout.addWidget(self.splitter)
+        The first fragment loads the dark-theme shell; subsequent fragments
+        only swap the #np-root content div via JavaScript so Chromium
+        re-parses that subtree instead of the whole document.
+        Passing force=True reloads the whole page even if nothing changed.
+        """
+        start = time.perf_counter()
+        content_hash = hash(html_text)
+        if content_hash == self._last_hash and not force:
+            return
+        self._last_hash = content_hash
+        self._current_html = html_text
+        
+        if force:
+            self._reset_shell()
         
-        # Initially hide the preview
-        self.viewer.hide()
+        if not html_text or html_text.isspace():
+            self.show_empty_message("HTML")
+            return
+
+        try:
+            # Complete documents bring their own <head>, so they always need a full load
+            written_in_background = False
+            if _FULL_DOCUMENT_RE.search(html_text, 0, _FULL_DOCUMENT_SCAN):
+                self._loaded_shell = False
+                self._shell_loading = False
+                written_in_background = self._load_document(html_text)
+            elif self._loaded_shell:
+                self._set_body(html_text)
+            elif self._shell_loading:
+                # Shell is still loading - apply the latest body once it is ready
+                self._pending_body = html_text
+            else:
+                self._shell_loading = True
+                self._pending_body = None
+                written_in_background = self._load_document(html_text, wrap=True)
+            
+        except Exception as e:
+            self._last_hash = None
+            self.show_error(html.escape(str(e)), "HTML Rendering Error")
+        else:
+            # Documents written on the pool thread report once they load
+            if not written_in_background:
+                self.render_finished.emit(time.perf_counter() - start)
     
-    def toggle_preview(self):
-        """Toggle the preview visibility"""
-        self.preview_visible = not self.preview_visible
-        self.viewer.setVisible(self.preview_visible)
+    def _load_document(self, html_text: str, wrap: bool = False):
+        """
+        Load a complete document; with wrap=True the dark-theme shell is added.
         
-        if self.preview_visible:
-            # Update preview with current text
-            self.update_preview()
-            # Set reasonable split sizes
-            total_width = self.splitter.width()
-            self.splitter.setSizes([total_width // 2, total_width // 2])
+        Small documents are passed to Chromium directly. Larger ones are
+        written to the temporary file in the background and loaded from there;
+        returns True for those.
+        """
+        if len(html_text) < SET_HTML_LIMIT:
+            # Supersede any document still being written for the temp file
+            self._queued_document = None
+            self._generation += 1
+            self._url_loaded = False
+            if wrap:
+                html_text = self._wrap_with_dark_theme(html_text)
+            # The base URL lets relative links resolve against the working directory
+            self.setHtml(html_text, QUrl.fromLocalFile(os.getcwd() + os.sep))
+            return False
         
-        return self.preview_visible
+        template = _dark_theme_template(self._colors_key) if wrap else None
+        if self._assembler is not None:
+            self._queued_document = (html_text, template)
+        else:
+            self._start_assembler(html_text, template)
+        return True
     
-    def update_preview(self):
-        """Update the preview with debouncing for performance"""
-        if self.preview_visible:
-            if self.live_preview_enabled:
-                # Cancel any pending update and start timer
-                self.update_timer.stop()
-                self.update_timer.start(self.update_delay)
-            else:
-                # Immediate update when not in live mode
-                self._do_update_preview()
+    def _start_assembler(self, html_text: str, template):
+        """
+        Hand a document to the thread pool.
+        """
+        self._assembler = HTMLAssembler(html_text, template, self.temp_file, self._generation)
+        self._assembler.signals.finished.connect(self._on_document_written)
+        self._assembler.signals.failed.connect(self._on_document_failed)
+        QThreadPool.globalInstance().start(self._assembler)
     
-    def _do_update_preview(self):
-        """Actually perform the preview update"""
-        self.viewer.update_content(self.text_edit.toPlainText())
+    def _next_document(self) -> bool:
+        """
+        Finish the running job and start the queued one, if any.
+        """
+        self._assembler = None
+        if self._queued_document is None:
+            return False
+        html_text, template = self._queued_document
+        self._queued_document = None
+        self._start_assembler(html_text, template)
+        return True
     
-    def set_live_preview(self, enabled):
-        """Enable/disable live preview updates"""
-        self.live_preview_enabled = enabled
+    def _on_document_written(self, generation: int, write_time: float):
+        """
+        Load the temporary file unless a newer document superseded it.
+        """
+        if self._next_document() or generation != self._generation:
+            return
         
-        if enabled and self.preview_visible:
-            try:
-                self.text_edit.textChanged.disconnect(self.update_preview)
-            except TypeError:
-                pass  # Not connected
-            self.text_edit.textChanged.connect(self.update_preview)
+        start = time.perf_counter()
+        # Reloading the same URL lets QWebEngine reuse its resource cache
+        if self._url_loaded:
+            self.triggerPageAction(QWebEnginePage.WebAction.Reload)
         else:
-            try:
-                self.text_edit.textChanged.disconnect(self.update_preview)
-            except TypeError:
-                pass  # Not connected
-            # Cancel any pending updates
-            self.update_timer.stop()
+            self.load(self._url)
+            self._url_loaded = True
+        self.render_finished.emit(write_time + time.perf_counter() - start)
+    
+    def _on_document_failed(self, generation: int, error_message: str):
+        """
+        Report a document that could not be written.
+        """
+        if self._next_document() or generation != self._generation:
+            return
+        self._last_hash = None
+        self.show_error(html.escape(error_message), "HTML Rendering Error")
+    
+    def _set_body(self, html_text: str):
+        """
+        Replace the content root of the loaded shell without reloading the page.
+        """
+        generation = self._generation
+        # The application world keeps working while page JavaScript is disabled
+        self.page().runJavaScript(
+            _PATCH_ROOT_JS % json.dumps(html_text),
+            QWebEngineScript.ScriptWorldId.ApplicationWorld.value,
+            lambda ok: self._on_body_patched(ok, generation)
+        )
+    
+    def _on_body_patched(self, ok, generation: int):
+        """
+        Fall back to a full shell load if the content root could not be patched.
+        """
+        if ok is True or generation != self._generation or not self._loaded_shell:
+            return
+        self._loaded_shell = False
+        self._shell_loading = True
+        self._pending_body = None
+        self._load_document(self._current_html, wrap=True)
+    
+    def set_full_features(self, enabled: bool):
+        """
+        Enable or disable JavaScript, plugins and WebGL for the previewed page.
+        
+        They are off by default so a static page load does not start V8 or
+        WebGL; changing them reloads the current document.
+        """
+        settings = self.settings()
+        for attribute in _OPTIONAL_FEATURES:
+            settings.setAttribute(attribute, enabled)
+        
+        if self._current_html:
+            self.update_content(self._current_html, force=True)
+    
+    def _on_load_finished(self, ok: bool):
+        """
+        Mark the shell as ready and flush any body queued while it was loading.
+        """
+        if not self._shell_loading:
+            return
+        
+        self._shell_loading = False
+        self._loaded_shell = ok
+        
+        if ok and self._pending_body is not None:
+            self._set_body(self._pending_body)
+        elif not ok:
+            # Force the next update to try a full load again
+            self._last_hash = None
+        self._pending_body = None
+    
+    def _wrap_with_dark_theme(self, html_content: str) -> str:
+        """
+        Wraps HTML content with a complete document structure and dark theme.
+        """
+        return _dark_theme_template(self._colors_key).substitute(content=html_content)
+    
+    def show_empty_message(self, file_type: str):
+        """
+        Show standardized empty state message.
+        """
+        message_html = _empty_html_template(self._colors_key).substitute(file_type=file_type)
+        self._reset_shell()
+        self.setHtml(message_html)
+    
+    def show_error(self, error_message: str, error_type: str = "Error"):
+        """
+        Show standardized error message.
+        """
+        error_html = _error_html_template(self._colors_key).substitute(
+            error_type=error_type, error_message=error_message
+        )
+        self._reset_shell()
+        self.setHtml(error_html)
+    
+    def _reset_shell(self):
+        """
+        Forget the loaded shell and temp file URL before the page is replaced.
+        """
+        self._loaded_shell = False
+        self._shell_loading = False
+        self._pending_body = None
+        self._url_loaded = False
+        # Anything still being written belongs to the replaced page
+        self._queued_document = None
+        self._generation += 1
+    
+    def __del__(self):
+        """
+        Clean up temporary file when the viewer is destroyed.
+        """
+        try:
+            os.unlink(self.temp_file)
+        except (AttributeError, OSError):
+            pass
+
+class HTMLPreviewWidget(BasePreviewWidget):
+    """
+    A widget that combines the text editor and the HTML viewer in a splitter.
+    """
+    viewer_reports_render_time = True
+    
+    def __init__(self, text_edit, colors):
+        super().__init__(text_edit, colors, HTMLViewer)
     
-    def set_update_delay(self, delay_ms):
-        """Set the debounce delay for live preview updates"""
-        self.update_delay = delay_ms
\ No newline at end of file
+    def _render_preview(self, text, force=False):
+        """Pass force through so F5 reloads the page even for unchanged text"""
+        self.viewer.update_content(text, force=force)
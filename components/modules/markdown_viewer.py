@@ -3,26 +3,299 @@ Improved Markdown Viewer module for Notepad--
 Provides comprehensive markdown preview functionality with clean, robust parsing
 """
 
-from PyQt6.QtCore import QTimer
+from PyQt6.QtCore import QTimer, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt6.QtGui import QTextDocument
 import re
 import html
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from string import Template
 from typing import Dict, List, Tuple
-from ..base_preview_viewer import BasePreviewViewer, BasePreviewWidget
+from ..base_preview_viewer import BasePreviewViewer, BasePreviewWidget, palette_key
+
+# Optional native (C) parser for very large documents
+try:
+    import cmarkgfm
+    from cmarkgfm.cmark import Options as CmarkOptions
+except ImportError:
+    cmarkgfm = None
+
+# Documents at least this long use the native parser when it is installed;
+# smaller ones keep the built-in parser's exact rendering
+NATIVE_PARSE_THRESHOLD = 100_000
+
+# Default document stylesheet; palette colours are filled in once per palette
+_MARKDOWN_STYLE = Template("""
+            body {
+                max-width: 900px;
+                margin: 0 auto;
+            }
+            
+            /* Headers */
+            h1, h2, h3, h4, h5, h6 {
+                margin-top: 24px;
+                margin-bottom: 16px;
+                font-weight: 600;
+                line-height: 1.25;
+                color: $white;
+            }
+            
+            h1 { 
+                font-size: 2em; 
+                border-bottom: 1px solid $gray3; 
+                padding-bottom: 0.3em; 
+                margin-top: 0;
+            }
+            h2 { 
+                font-size: 1.5em; 
+                border-bottom: 1px solid $gray3; 
+                padding-bottom: 0.3em; 
+            }
+            h3 { font-size: 1.25em; }
+            h4 { font-size: 1em; }
+            h5 { font-size: 0.875em; }
+            h6 { font-size: 0.85em; color: $gray4; }
+            
+            /* Paragraphs */
+            p {
+                margin-bottom: 16px;
+                margin-top: 0;
+            }
+            
+            /* Text formatting */
+            strong { font-weight: 600; }
+            em { font-style: italic; }
+            del { text-decoration: line-through; color: $gray4; }
+            
+            /* Links */
+            a {
+                color: $blue;
+                text-decoration: none;
+            }
+            a:hover {
+                text-decoration: underline;
+            }
+            
+            /* Code */
+            code {
+                background-color: $gray2;
+                padding: 2px 4px;
+                border-radius: 2px;
+                font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
+                font-size: 0.9em;
+                color: $green;
+            }
+            
+            pre {
+                background-color: $gray2;
+                border: 1px solid $gray3;
+                border-radius: 2px;
+                padding: 16px;
+                overflow-x: auto;
+                margin-bottom: 16px;
+                line-height: 1.45;
+            }
+            
+            pre code {
+                background-color: transparent;
+                padding: 0;
+                color: $white;
+                display: block;
+            }
+            
+            /* Blockquotes */
+            blockquote {
+                border-left: 4px solid $gray3;
+                padding-left: 16px;
+                color: $gray4;
+                margin: 16px 0;
+                font-style: italic;
+            }
+            
+            blockquote p {
+                margin-bottom: 8px;
+            }
+            
+            blockquote p:last-child {
+                margin-bottom: 0;
+            }
+            
+            /* Lists */
+            ul, ol {
+                margin-bottom: 16px;
+                padding-left: 2em;
+            }
+            
+            li {
+                margin-bottom: 4px;
+            }
+            
+            /* Tables */
+            table {
+                border-collapse: collapse;
+                margin-bottom: 16px;
+                width: 100%;
+            }
+            
+            th, td {
+                border: 1px solid $gray3;
+                padding: 8px 12px;
+            }
+            
+            th {
+                background-color: $gray2;
+                font-weight: 600;
+            }
+            
+            tr:nth-child(even) {
+                background-color: rgba(255, 255, 255, 0.02);
+            }
+            
+            /* Horizontal rules */
+            hr {
+                border: 0;
+                height: 1px;
+                background: $gray3;
+                margin: 24px 0;
+            }
+            
+            /* Images */
+            img {
+                max-width: 100%;
+                height: auto;
+                border-radius: 2px;
+                margin: 16px 0;
+            }
+            
+            /* Footnotes */
+            .footnotes {
+                margin-top: 48px;
+                font-size: 0.9em;
+                color: $gray4;
+            }
+            
+            .footnotes hr {
+                margin: 24px 0 16px 0;
+            }
+            
+            .footnotes ol {
+                padding-left: 1.5em;
+            }
+            
+            .footnote-backref {
+                text-decoration: none;
+                margin-left: 0.5em;
+            }
+            
+            sup {
+                font-size: 0.8em;
+                vertical-align: super;
+                line-height: 0;
+            }
+        """)
+
+
+@lru_cache(maxsize=4)
+def _markdown_stylesheet(colors_key):
+    """Markdown document stylesheet, built once per palette"""
+    return _MARKDOWN_STYLE.substitute(dict(colors_key))
+
+
+# Patterns used by MarkdownParser, compiled once at import
+_RE_LINK_REF = re.compile(r'^\s*\[([^\]]+)\]:\s*(\S+)(?:\s+"([^"]*)")?$')
+_RE_FOOTNOTE_DEF = re.compile(r'^\[\^([^\]]+)\]:\s+(.+)$')
+_RE_FENCED = re.compile(r'^```(\w*)\n(.*?)\n```$', re.MULTILINE | re.DOTALL)
+_RE_BLOCK_SPLIT = re.compile(r'\n\s*\n')
+# Code block placeholders are NUL-delimited indices; NUL never survives in the text
+_RE_CODE_PLACEHOLDER = re.compile('\x00(\\d+)\x00')
+_RE_ATX_HEADER = re.compile(r'^(#{1,6})\s+(.+?)(?:\s+#+)?$')
+_RE_HEADER_ID = re.compile(r'[^\w\-]')
+# One alternative per rule character, so no two space runs are adjacent
+_RE_HR = re.compile(r'^[ ]{0,3}(?:(?:-[ ]*){3,}|(?:\*[ ]*){3,}|(?:_[ ]*){3,})$')
+# Ordered or unordered list item, with an optional task checkbox
+_RE_LIST_ITEM = re.compile(
+    r'^(?P<indent>\s*)(?:(?P<ol>\d+)\.|(?P<ul>[-*+]))\s+'
+    r'(?:\[(?P<task>[ xX])\]\s+)?(?P<content>.*)$'
+)
+_RE_TABLE_SEP = re.compile(r'^[\s\-:|]+$')
+# All inline rules as one alternation, scanned once per block. At any given
+# position the earliest alternative wins, so the order below is significant.
+# The leading lookahead lets the engine skip plain text quickly. Emphasis
+# content may not contain its own delimiter (except a nested span of the
+# other weight), so a failed match stops at the next delimiter instead of
+# backtracking to the end of the line. A reference link's second bracket may
+# not be a footnote ([^1]) or the text of an inline link ([text](url)).
+_RE_INLINE_START = re.compile(r'[`!\[&*_~]')
+_RE_INLINE = re.compile(r'(?=[`!\[&*_~])(?:' + '|'.join([
+    r'(?P<code>`(?P<code_text>[^`]+)`)',
+    r'(?P<image>!\[(?P<image_alt>[^\]]*)\]\((?P<image_src>[^\)]+?)(?:\s+&quot;(?P<image_title>[^&]+)&quot;)?\))',
+    r'(?P<link>\[(?P<link_text>[^\]]+)\]\((?P<link_href>[^\)]+?)(?:\s+&quot;(?P<link_title>[^&]+)&quot;)?\))',
+    r'(?P<footnote>\[\^(?P<footnote_id>[^\]]+)\])',
+    r'(?P<ref_link>\[(?P<ref_text>[^\]]+)\]\[(?P<ref_id>(?!\^)[^\]]*)\](?!\())',
+    r'(?P<autolink>&lt;(?P<autolink_url>https?://[^\s&]+)&gt;)',
+    r'(?P<email>&lt;(?P<email_address>[^@\s]+@[^@\s]+\.[^@\s]+)&gt;)',
+    r'(?P<strong_em>\*\*\*(?P<strong_em_text>[^*\s](?:[^*\n]*[^*\s])?)\*\*\*'
+    r'|___(?P<strong_em_text_u>[^_\s](?:[^_\n]*[^_\s])?)___)',
+    r'(?P<strong>\*\*(?P<strong_text>[^*\s](?:(?:[^*\n]|\*(?!\*))*?[^*\s])?)\*\*'
+    r'|__(?P<strong_text_u>[^_\s](?:(?:[^_\n]|_(?!_))*?[^_\s])?)__)',
+    r'(?P<em>\*(?P<em_text>[^*\s](?:(?:[^*\n]|\*\*[^*\s](?:[^*\n]*[^*\s])?\*\*)*?[^*\s])?)\*(?!\*)'
+    r'|_(?P<em_text_u>[^_\s](?:(?:[^_\n]|__[^_\s](?:[^_\n]*[^_\s])?__)*?[^_\s])?)_(?!_))',
+    r'(?P<strike>~~(?P<strike_text>[^~\s](?:[^~\n]*[^~\s])?)~~)',
+]) + ')')
+_RE_LINE_BREAK = re.compile(r'  $', re.MULTILINE)
+
+# Opening (up to the id value) and closing tag for each header level
+_HEADER_TAGS = {level: (f'<h{level} id="', f'</h{level}>') for level in range(1, 7)}
+
+
+@lru_cache(maxsize=1024)
+def _header_slug(title):
+    """Anchor id for a header; headers mostly stay the same between renders"""
+    return _RE_HEADER_ID.sub('-', title.lower()).strip('-')
+
+
+def _setext_level(line):
+    """1 or 2 for a line of only '=' or only '-' plus trailing whitespace, else 0"""
+    underline = line.rstrip()
+    if underline[:1] == '=' and not underline.strip('='):
+        return 1
+    if underline[:1] == '-' and not underline.strip('-'):
+        return 2
+    return 0
+
 
 class MarkdownParser:
     """Clean and robust markdown to HTML converter"""
     
     def __init__(self):
+        # _RE_INLINE group name -> handler returning the HTML for that match
+        self._inline_handlers = {
+            'code': self._inline_code,
+            'image': self._inline_image,
+            'link': self._inline_link,
+            'footnote': self._inline_footnote,
+            'ref_link': self._inline_ref_link,
+            'autolink': self._inline_autolink,
+            'email': self._inline_email,
+            'strong_em': self._inline_strong_em,
+            'strong': self._inline_strong,
+            'em': self._inline_em,
+            'strike': self._inline_strike,
+        }
+        
+        # Rendered HTML of recently seen blocks; survives reset() so an edit
+        # only re-parses the blocks it touched
+        self._block_cache = OrderedDict()
+        self._block_cache_cap = 512
         self.reset()
         
     def reset(self):
         """Reset parser state"""
         self.footnotes = {}
-        self.footnote_refs = []
+        self.footnote_refs = {}  # insertion-ordered set of referenced ids
         self.link_refs = {}
-        self.code_blocks = {}
-        self.code_counter = 0
+        self.code_blocks = []
         
     def parse(self, text: str) -> str:
         """Convert markdown text to HTML"""
@@ -34,6 +307,10 @@ class MarkdownParser:
         # Normalize line endings
         text = text.replace('\r\n', '\n').replace('\r', '\n')
         
+        # NUL delimits code block placeholders, so none may come from the user
+        if '\x00' in text:
+            text = text.replace('\x00', '\ufffd')
+        
         # Processing pipeline
         text = self._extract_reference_definitions(text)
         text = self._protect_code_blocks(text)
@@ -46,20 +323,31 @@ class MarkdownParser:
         
         return text
     
+    def invalidate_cache(self):
+        """Forget all cached block HTML"""
+        self._block_cache.clear()
+    
     def _extract_reference_definitions(self, text: str) -> str:
         """Extract link references and footnote definitions"""
+        # Both kinds of definition contain ']:', so most documents and most
+        # lines are ruled out without running either pattern
+        if ']:' not in text:
+            return text
+        
         lines = []
         
         for line in text.split('\n'):
+            if ']:' not in line:
+                lines.append(line)
             # Link references: [ref]: url "title"
-            if match := re.match(r'^\s*\[([^\]]+)\]:\s*(\S+)(?:\s+"([^"]*)")?$', line):
+            elif match := _RE_LINK_REF.match(line):
                 ref_id = match.group(1).lower()
                 self.link_refs[ref_id] = {
                     'url': match.group(2),
                     'title': match.group(3) or ''
                 }
             # Footnote definitions: [^ref]: text
-            elif match := re.match(r'^\[\^([^\]]+)\]:\s+(.+)$', line):
+            elif match := _RE_FOOTNOTE_DEF.match(line):
                 self.footnotes[match.group(1)] = match.group(2)
             else:
                 lines.append(line)
@@ -72,83 +360,78 @@ class MarkdownParser:
         def replace_fenced(match):
             lang = match.group(1) or ''
             code = html.escape(match.group(2).rstrip('\n'))
-            placeholder = f'§CODE{self.code_counter}§'
-            self.code_blocks[placeholder] = f'<pre><code class="language-{lang}">{code}</code></pre>'
-            self.code_counter += 1
-            return placeholder
-        
-        text = re.sub(
-            r'^```(\w*)\n(.*?)\n```$',
-            replace_fenced,
-            text,
-            flags=re.MULTILINE | re.DOTALL
-        )
+            return self._stash_code_block(f'<pre><code class="language-{lang}">{code}</code></pre>')
         
-        # Indented code blocks
-        lines = text.split('\n')
+        text = _RE_FENCED.sub(replace_fenced, text)
+        
+        # Indented code blocks. Only lines starting with a tab or four spaces
+        # can be code, so every other line is ruled out by its first character
         result = []
         code_lines = []
-        in_code = False
         
-        for line in lines:
-            # Check if this is already a protected code block
-            if line.strip().startswith('§CODE'):
-                if in_code and code_lines:
-                    # Save accumulated code
-                    placeholder = f'§CODE{self.code_counter}§'
-                    code = html.escape('\n'.join(code_lines))
-                    self.code_blocks[placeholder] = f'<pre><code>{code}</code></pre>'
-                    self.code_counter += 1
-                    result.append(placeholder)
-                    code_lines = []
-                    in_code = False
-                result.append(line)
-            elif line.startswith(('    ', '\t')) and line.strip():
-                # Code line
-                in_code = True
-                code_lines.append(line[4:] if line.startswith('    ') else line[1:])
-            else:
-                # Not code
-                if in_code and code_lines:
-                    # Save accumulated code
-                    placeholder = f'§CODE{self.code_counter}§'
-                    code = html.escape('\n'.join(code_lines))
-                    self.code_blocks[placeholder] = f'<pre><code>{code}</code></pre>'
-                    self.code_counter += 1
-                    result.append(placeholder)
-                    code_lines = []
-                    in_code = False
-                result.append(line)
+        for line in text.split('\n'):
+            first = line[:1]
+            if first == '\t' or (first == ' ' and line.startswith('    ')):
+                content = line.lstrip()
+                # Blank lines and indented placeholders are not code
+                if content and content[:1] != '\x00':
+                    code_lines.append(line[1:] if first == '\t' else line[4:])
+                    continue
+            
+            if code_lines:
+                # Save accumulated code
+                code = html.escape('\n'.join(code_lines))
+                result.append(self._stash_code_block(f'<pre><code>{code}</code></pre>'))
+                code_lines = []
+            result.append(line)
         
         # Handle trailing code block
-        if in_code and code_lines:
-            placeholder = f'§CODE{self.code_counter}§'
+        if code_lines:
             code = html.escape('\n'.join(code_lines))
-            self.code_blocks[placeholder] = f'<pre><code>{code}</code></pre>'
-            self.code_counter += 1
-            result.append(placeholder)
+            result.append(self._stash_code_block(f'<pre><code>{code}</code></pre>'))
         
         return '\n'.join(result)
     
+    def _stash_code_block(self, code_html: str) -> str:
+        """Store rendered code HTML and return the placeholder standing in for it"""
+        self.code_blocks.append(code_html)
+        return f'\x00{len(self.code_blocks) - 1}\x00'
+    
     def _restore_code_blocks(self, text: str) -> str:
         """Restore protected code blocks"""
-        for placeholder, code in self.code_blocks.items():
-            text = text.replace(placeholder, code)
-        return text
+        if not self.code_blocks:
+            return text
+        code_blocks = self.code_blocks
+        
+        def restore(match):
+            index = int(match.group(1))
+            # Placeholder-shaped text with no stored block behind it is left alone
+            return code_blocks[index] if index < len(code_blocks) else match.group(0)
+        
+        return _RE_CODE_PLACEHOLDER.sub(restore, text)
+    
+    @staticmethod
+    def _split_blocks(text: str) -> list:
+        """Split text on blank lines into stripped, non-empty blocks"""
+        # A blank line may hold spaces or tabs, so a plain '\n\n' search would
+        # merge paragraphs the compiled pattern keeps apart
+        return [block for block in map(str.strip, _RE_BLOCK_SPLIT.split(text)) if block]
     
     def _process_block_elements(self, text: str) -> str:
         """Process all block-level elements"""
-        blocks = re.split(r'\n\s*\n', text)
-        processed_blocks = []
+        blocks = self._split_blocks(text)
+        processed_blocks = [None] * len(blocks)
         
-        for block in blocks:
-            block = block.strip()
-            if not block:
+        for index, block in enumerate(blocks):
+            # Skip protected code blocks
+            if block[:1] == '\x00':
+                processed_blocks[index] = block
                 continue
             
-            # Skip protected code blocks
-            if block.startswith('§CODE'):
-                processed_blocks.append(block)
+            cached = self._block_cache.get(block)
+            if cached is not None:
+                self._block_cache.move_to_end(block)
+                processed_blocks[index] = cached
                 continue
             
             # Try each block processor
@@ -160,42 +443,54 @@ class MarkdownParser:
                 self._process_table(block) or
                 self._process_paragraph(block)
             )
-            processed_blocks.append(processed)
+            processed_blocks[index] = processed
+            
+            # Blocks with brackets may use link or footnote definitions from
+            # elsewhere in the document, so only self-contained ones are cached
+            if '[' not in block:
+                self._block_cache[block] = processed
+                if len(self._block_cache) > self._block_cache_cap:
+                    self._block_cache.popitem(last=False)
         
         return '\n'.join(processed_blocks)
     
     def _process_header(self, block: str) -> str:
         """Process headers"""
+        # ATX headers start with '#', setext headers need a second line
+        if block[:1] != '#' and '\n' not in block:
+            return None
+        
         lines = block.split('\n')
         
         # ATX headers
-        if match := re.match(r'^(#{1,6})\s+(.+?)(?:\s+#+)?$', lines[0]):
+        if match := _RE_ATX_HEADER.match(lines[0]):
             level = len(match.group(1))
-            content = self._process_inline(html.escape(match.group(2).strip()))
-            header_id = re.sub(r'[^\w\-]', '-', match.group(2).lower()).strip('-')
-            return f'<h{level} id="{header_id}">{content}</h{level}>'
-        
+            title = match.group(2)
+            content = self._process_inline(html.escape(title.strip()))
         # Setext headers
-        if len(lines) >= 2:
-            if re.match(r'^=+\s*$', lines[1]):
-                content = self._process_inline(html.escape(lines[0]))
-                header_id = re.sub(r'[^\w\-]', '-', lines[0].lower()).strip('-')
-                return f'<h1 id="{header_id}">{content}</h1>'
-            elif re.match(r'^-+\s*$', lines[1]):
-                content = self._process_inline(html.escape(lines[0]))
-                header_id = re.sub(r'[^\w\-]', '-', lines[0].lower()).strip('-')
-                return f'<h2 id="{header_id}">{content}</h2>'
+        elif len(lines) >= 2 and (level := _setext_level(lines[1])):
+            title = lines[0]
+            content = self._process_inline(html.escape(title))
+        else:
+            return None
         
-        return None
+        header_id = _header_slug(title)
+        open_tag, close_tag = _HEADER_TAGS[level]
+        return f'{open_tag}{header_id}">{content}{close_tag}'
     
     def _process_hr(self, block: str) -> str:
         """Process horizontal rules"""
-        if re.match(r'^[ ]{0,3}([-*_])([ ]*\1[ ]*){2,}$', block.strip()):
+        line = block.strip()
+        if line[:1] in ('-', '*', '_') and _RE_HR.match(line):
             return '<hr>'
         return None
     
     def _process_blockquote(self, block: str) -> str:
         """Process blockquotes"""
+        # Blocks arrive stripped, so a quote's first line starts with '>'
+        if not block.startswith('>'):
+            return None
+        
         lines = block.split('\n')
         if all(line.startswith('>') or not line.strip() for line in lines):
             # Extract quote content
@@ -217,40 +512,42 @@ class MarkdownParser:
     
     def _process_list(self, block: str) -> str:
         """Process lists with proper nesting support"""
+        first = block.lstrip()[:1]
+        if first not in ('-', '*', '+') and not first.isdigit():
+            return None
+        
         lines = block.split('\n')
         
         # Check if this is a list
         first_line = lines[0]
-        is_ordered = bool(re.match(r'^\s*\d+\.\s+', first_line))
-        is_unordered = bool(re.match(r'^\s*[-*+]\s+', first_line))
-        
-        if not (is_ordered or is_unordered):
+        match = _RE_LIST_ITEM.match(first_line)
+        if not match:
             return None
         
+        # Items of the other list kind are continuation lines
+        is_ordered = match.group('ol') is not None
+        kind = 'ol' if is_ordered else 'ul'
+        
         # Parse list items with indentation levels
         items = []
         current_item = []
         base_indent = len(first_line) - len(first_line.lstrip())
         
         for line in lines:
-            if is_ordered:
-                match = re.match(r'^(\s*)(\d+)\.\s+(.*)$', line)
-            else:
-                match = re.match(r'^(\s*)[-*+]\s+(.*)$', line)
+            match = _RE_LIST_ITEM.match(line)
             
-            if match:
+            if match and match.group(kind) is not None:
                 if current_item:
                     items.append((base_indent, '\n'.join(current_item)))
                     current_item = []
                 
-                indent = len(match.group(1))
-                content = match.group(3) if is_ordered else match.group(2)
+                indent = len(match.group('indent'))
+                content = match.group('content')
                 
-                # Check for task list
-                task_match = re.match(r'\[([ xX])\]\s+(.*)$', content)
-                if task_match:
-                    checked = task_match.group(1).lower() == 'x'
-                    content = ('☑' if checked else '☐') + ' ' + task_match.group(2)
+                # Task list checkbox
+                task = match.group('task')
+                if task is not None:
+                    content = f"{'☐' if task == ' ' else '☑'} {content}"
                 
                 current_item = [content]
                 base_indent = min(base_indent, indent)
@@ -261,19 +558,21 @@ class MarkdownParser:
         if current_item:
             items.append((base_indent, '\n'.join(current_item)))
         
-        # Build HTML
-        tag = 'ol' if is_ordered else 'ul'
-        html_items = []
-        
-        for indent, content in items:
-            # Process inline elements in content
-            processed = self._process_inline(html.escape(content.strip()))
-            html_items.append(f'<li>{processed}</li>')
+        # Build HTML, processing inline elements in each item
+        tag = kind
+        process_inline = self._process_inline
+        html_items = ''.join([
+            f'<li>{process_inline(html.escape(content.strip()))}</li>'
+            for indent, content in items
+        ])
         
-        return f'<{tag}>{"".join(html_items)}</{tag}>'
+        return f'<{tag}>{html_items}</{tag}>'
     
     def _process_table(self, block: str) -> str:
         """Process tables"""
+        if '|' not in block or '\n' not in block:
+            return None
+        
         lines = block.split('\n')
         
         # Check for table pattern
@@ -281,7 +580,7 @@ class MarkdownParser:
             return None
         
         # Check separator line
-        if not re.match(r'^[\s\-:|]+$', lines[1]):
+        if not _RE_TABLE_SEP.match(lines[1]):
             return None
         
         # Parse alignment
@@ -297,37 +596,35 @@ class MarkdownParser:
             else:
                 alignments.append('')
         
-        # Build table
-        html_parts = ['<table>', '<thead>', '<tr>']
+        # Header row, with empty cells removed
+        headers = [cell for cell in map(str.strip, lines[0].split('|')) if cell]
         
-        # Header row
-        headers = [cell.strip() for cell in lines[0].split('|')]
-        headers = [h for h in headers if h]  # Remove empty
+        # One alignment per header column; zip() below also stops body rows
+        # from exceeding the header count
+        column_aligns = alignments[:len(headers)]
+        column_aligns += [''] * (len(headers) - len(column_aligns))
         
-        for i, header in enumerate(headers):
-            align = alignments[i] if i < len(alignments) else ''
-            content = self._process_inline(html.escape(header))
-            html_parts.append(f'<th{align}>{content}</th>')
+        process_inline = self._process_inline
+        escape = html.escape
+        html_parts = ['<table><thead><tr>']
+        append = html_parts.append
         
-        html_parts.extend(['</tr>', '</thead>', '<tbody>'])
+        for align, header in zip(column_aligns, headers):
+            append(f'<th{align}>{process_inline(escape(header))}</th>')
         
-        # Body rows
+        append('</tr></thead><tbody>')
+        
+        # Body rows, keeping empty cells
         for line in lines[2:]:
             if '|' not in line:
                 continue
             
-            cells = [cell.strip() for cell in line.split('|')]
-            cells = [c for c in cells if c is not None]  # Keep empty cells
-            
-            html_parts.append('<tr>')
-            for i, cell in enumerate(cells):
-                if i < len(headers):  # Don't exceed header count
-                    align = alignments[i] if i < len(alignments) else ''
-                    content = self._process_inline(html.escape(cell))
-                    html_parts.append(f'<td{align}>{content}</td>')
-            html_parts.append('</tr>')
+            append('<tr>')
+            for align, cell in zip(column_aligns, line.split('|')):
+                append(f'<td{align}>{process_inline(escape(cell.strip()))}</td>')
+            append('</tr>')
         
-        html_parts.extend(['</tbody>', '</table>'])
+        append('</tbody></table>')
         return ''.join(html_parts)
     
     def _process_paragraph(self, block: str) -> str:
@@ -337,81 +634,84 @@ class MarkdownParser:
     
     def _process_inline(self, text: str) -> str:
         """Process inline elements in already-escaped text"""
-        # Inline code (must be first to protect from other processing)
-        text = re.sub(
-            r'`([^`]+)`',
-            lambda m: f'<code>{m.group(1)}</code>',
-            text
-        )
-        
-        # Images
-        text = re.sub(
-            r'!\[([^\]]*)\]\(([^\)]+?)(?:\s+&quot;([^&]+)&quot;)?\)',
-            lambda m: f'<img src="{m.group(2)}" alt="{m.group(1)}" title="{m.group(3) or ""}">',
-            text
-        )
-        
-        # Links
-        text = re.sub(
-            r'\[([^\]]+)\]\(([^\)]+?)(?:\s+&quot;([^&]+)&quot;)?\)',
-            lambda m: f'<a href="{m.group(2)}" title="{m.group(3) or ""}">{m.group(1)}</a>',
-            text
-        )
-        
-        # Reference links
-        def process_ref_link(match):
-            link_text = match.group(1)
-            ref_id = (match.group(2) or link_text).lower()
-            if ref_id in self.link_refs:
-                ref = self.link_refs[ref_id]
-                title_attr = f' title="{ref["title"]}"' if ref['title'] else ''
-                return f'<a href="{ref["url"]}"{title_attr}>{link_text}</a>'
-            return match.group(0)
-        
-        text = re.sub(r'\[([^\]]+)\]\[([^\]]*)\]', process_ref_link, text)
-        
-        # Autolinks
-        text = re.sub(
-            r'&lt;(https?://[^\s&]+)&gt;',
-            r'<a href="\1">\1</a>',
-            text
-        )
-        text = re.sub(
-            r'&lt;([^@\s]+@[^@\s]+\.[^@\s]+)&gt;',
-            r'<a href="mailto:\1">\1</a>',
-            text
-        )
-        
-        # Footnotes
-        def process_footnote(match):
-            ref_id = match.group(1)
-            if ref_id not in self.footnote_refs:
-                self.footnote_refs.append(ref_id)
-            return f'<sup><a href="#fn{ref_id}" id="fnref{ref_id}">[{ref_id}]</a></sup>'
-        
-        text = re.sub(r'\[\^([^\]]+)\]', process_footnote, text)
-        
-        # Emphasis (order matters!)
-        # Strong + emphasis
-        text = re.sub(r'\*\*\*(\S(?:.*?\S)?)\*\*\*', r'<strong><em>\1</em></strong>', text)
-        text = re.sub(r'___(\S(?:.*?\S)?)___', r'<strong><em>\1</em></strong>', text)
-        
-        # Strong
-        text = re.sub(r'\*\*(\S(?:.*?\S)?)\*\*', r'<strong>\1</strong>', text)
-        text = re.sub(r'__(\S(?:.*?\S)?)__', r'<strong>\1</strong>', text)
-        
-        # Emphasis
-        text = re.sub(r'\*(\S(?:.*?\S)?)\*', r'<em>\1</em>', text)
-        text = re.sub(r'_(\S(?:.*?\S)?)_', r'<em>\1</em>', text)
-        
-        # Strikethrough
-        text = re.sub(r'~~(\S(?:.*?\S)?)~~', r'<del>\1</del>', text)
+        # Plain prose has no span delimiters and no hard breaks, so it comes
+        # back untouched without running either substitution
+        text = self._scan_nested(text)
         
         # Line breaks
-        text = re.sub(r'  $', '<br>', text, flags=re.MULTILINE)
-        
+        if '  ' in text:
+            text = _RE_LINE_BREAK.sub('<br>', text)
         return text
     
+    def _scan_inline(self, text: str) -> str:
+        """Replace every inline span in a single left-to-right pass"""
+        handlers = self._inline_handlers
+        return _RE_INLINE.sub(lambda match: handlers[match.lastgroup](match), text)
+    
+    def _scan_nested(self, text: str) -> str:
+        """Scan text for spans, skipping the common case of plain text"""
+        return self._scan_inline(text) if _RE_INLINE_START.search(text) else text
+    
+    def _inline_code(self, match):
+        """Inline code - contents stay literal"""
+        return f'<code>{match.group("code_text")}</code>'
+    
+    def _inline_image(self, match):
+        """Image"""
+        return (f'<img src="{match.group("image_src")}" alt="{match.group("image_alt")}" '
+                f'title="{match.group("image_title") or ""}">')
+    
+    def _inline_link(self, match):
+        """Inline link"""
+        text = self._scan_nested(match.group('link_text'))
+        return f'<a href="{match.group("link_href")}" title="{match.group("link_title") or ""}">{text}</a>'
+    
+    def _inline_footnote(self, match):
+        """Footnote reference, numbered in order of first use"""
+        ref_id = match.group('footnote_id')
+        self.footnote_refs.setdefault(ref_id)
+        return f'<sup><a href="#fn{ref_id}" id="fnref{ref_id}">[{ref_id}]</a></sup>'
+    
+    def _inline_ref_link(self, match):
+        """Reference link resolved against the collected definitions"""
+        link_text = match.group('ref_text')
+        ref_id = (match.group('ref_id') or link_text).lower()
+        if ref_id in self.link_refs:
+            ref = self.link_refs[ref_id]
+            title_attr = f' title="{ref["title"]}"' if ref['title'] else ''
+            return f'<a href="{ref["url"]}"{title_attr}>{self._scan_nested(link_text)}</a>'
+        # Unknown reference - leave the brackets but format their contents
+        return f'[{self._scan_nested(link_text)}][{self._scan_nested(match.group("ref_id"))}]'
+    
+    def _inline_autolink(self, match):
+        """URL autolink"""
+        url = match.group('autolink_url')
+        return f'<a href="{url}">{url}</a>'
+    
+    def _inline_email(self, match):
+        """Email autolink"""
+        address = match.group('email_address')
+        return f'<a href="mailto:{address}">{address}</a>'
+    
+    def _inline_strong_em(self, match):
+        """Strong + emphasis"""
+        text = match.group('strong_em_text') or match.group('strong_em_text_u')
+        return f'<strong><em>{self._scan_nested(text)}</em></strong>'
+    
+    def _inline_strong(self, match):
+        """Strong"""
+        text = match.group('strong_text') or match.group('strong_text_u')
+        return f'<strong>{self._scan_nested(text)}</strong>'
+    
+    def _inline_em(self, match):
+        """Emphasis"""
+        text = match.group('em_text') or match.group('em_text_u')
+        return f'<em>{self._scan_nested(text)}</em>'
+    
+    def _inline_strike(self, match):
+        """Strikethrough"""
+        return f'<del>{self._scan_nested(match.group("strike_text"))}</del>'
+    
     def _generate_footnotes_html(self) -> str:
         """Generate HTML for footnotes"""
         html_parts = ['\n<div class="footnotes">\n<hr>\n<ol>']
@@ -428,197 +728,60 @@ class MarkdownParser:
         return '\n'.join(html_parts)
 
 
-class MarkdownViewer(BasePreviewViewer):
-    """Markdown preview widget with enhanced features"""
+# cmark-gfm output is adjusted to render like MarkdownParser's. A '<' that
+# does not open an autolink is swapped for this private-use character before
+# parsing, so raw HTML stays text (shown escaped) instead of being omitted
+_NATIVE_LT = '\ue000'
+_RE_NATIVE_RAW_LT = re.compile(r'<(?!(?:https?://[^\s<>]*|[^@\s<>]+@[^@\s<>]+\.[^@\s<>]+)>)')
+_RE_NATIVE_TASK = re.compile(r'<input type="checkbox"( checked="")? disabled="" />')
+_RE_NATIVE_HEADER = re.compile(r'<h([1-6]) data-sourcepos="(\d+):[^"]*">')
+_RE_NATIVE_SOURCEPOS = re.compile(r' data-sourcepos="[^"]*"')
+_RE_NATIVE_QUOTE_PREFIX = re.compile(r'^[\s>]*')
+
+
+class NativeMarkdownParser:
+    """GitHub-flavoured markdown to HTML through the cmark-gfm C library"""
     
-    def __init__(self, colors):
-        super().__init__(colors)
-        self.parser = MarkdownParser()
+    @staticmethod
+    def can_parse(text: str) -> bool:
+        """False for text that already uses the character raw HTML is hidden behind"""
+        return _NATIVE_LT not in text
     
-    def setup_custom_style(self):
-        """Apply markdown-specific styling to the preview"""
-        style = f"""
-            body {{
-                max-width: 900px;
-                margin: 0 auto;
-            }}
-            
-            /* Headers */
-            h1, h2, h3, h4, h5, h6 {{
-                margin-top: 24px;
-                margin-bottom: 16px;
-                font-weight: 600;
-                line-height: 1.25;
-                color: {self.colors["white"]};
-            }}
-            
-            h1 {{ 
-                font-size: 2em; 
-                border-bottom: 1px solid {self.colors["gray3"]}; 
-                padding-bottom: 0.3em; 
-                margin-top: 0;
-            }}
-            h2 {{ 
-                font-size: 1.5em; 
-                border-bottom: 1px solid {self.colors["gray3"]}; 
-                padding-bottom: 0.3em; 
-            }}
-            h3 {{ font-size: 1.25em; }}
-            h4 {{ font-size: 1em; }}
-            h5 {{ font-size: 0.875em; }}
-            h6 {{ font-size: 0.85em; color: {self.colors["gray4"]}; }}
-            
-            /* Paragraphs */
-            p {{
-                margin-bottom: 16px;
-                margin-top: 0;
-            }}
-            
-            /* Text formatting */
-            strong {{ font-weight: 600; }}
-            em {{ font-style: italic; }}
-            del {{ text-decoration: line-through; color: {self.colors["gray4"]}; }}
-            
-            /* Links */
-            a {{
-                color: {self.colors["blue"]};
-                text-decoration: none;
-            }}
-            a:hover {{
-                text-decoration: underline;
-            }}
-            
-            /* Code */
-            code {{
-                background-color: {self.colors["gray2"]};
-                padding: 2px 4px;
-                border-radius: 2px;
-                font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
-                font-size: 0.9em;
-                color: {self.colors["green"]};
-            }}
-            
-            pre {{
-                background-color: {self.colors["gray2"]};
-                border: 1px solid {self.colors["gray3"]};
-                border-radius: 2px;
-                padding: 16px;
-                overflow-x: auto;
-                margin-bottom: 16px;
-                line-height: 1.45;
-            }}
-            
-            pre code {{
-                background-color: transparent;
-                padding: 0;
-                color: {self.colors["white"]};
-                display: block;
-            }}
-            
-            /* Blockquotes */
-            blockquote {{
-                border-left: 4px solid {self.colors["gray3"]};
-                padding-left: 16px;
-                color: {self.colors["gray4"]};
-                margin: 16px 0;
-                font-style: italic;
-            }}
-            
-            blockquote p {{
-                margin-bottom: 8px;
-            }}
-            
-            blockquote p:last-child {{
-                margin-bottom: 0;
-            }}
-            
-            /* Lists */
-            ul, ol {{
-                margin-bottom: 16px;
-                padding-left: 2em;
-            }}
-            
-            li {{
-                margin-bottom: 4px;
-            }}
-            
-            /* Tables */
-            table {{
-                border-collapse: collapse;
-                margin-bottom: 16px;
-                width: 100%;
-            }}
-            
-            th, td {{
-                border: 1px solid {self.colors["gray3"]};
-                padding: 8px 12px;
-            }}
-            
-            th {{
-                background-color: {self.colors["gray2"]};
-                font-weight: 600;
-            }}
-            
-            tr:nth-child(even) {{
-                background-color: rgba(255, 255, 255, 0.02);
-            }}
-            
-            /* Horizontal rules */
-            hr {{
-                border: 0;
-                height: 1px;
-                background: {self.colors["gray3"]};
-                margin: 24px 0;
-            }}
-            
-            /* Images */
-            img {{
-                max-width: 100%;
-                height: auto;
-                border-radius: 2px;
-                margin: 16px 0;
-            }}
-            
-            /* Footnotes */
-            .footnotes {{
-                margin-top: 48px;
-                font-size: 0.9em;
-                color: {self.colors["gray4"]};
-            }}
-            
-            .footnotes hr {{
-                margin: 24px 0 16px 0;
-            }}
-            
-            .footnotes ol {{
-                padding-left: 1.5em;
-            }}
-            
-            .footnote-backref {{
-                text-decoration: none;
-                margin-left: 0.5em;
-            }}
-            
-            sup {{
-                font-size: 0.8em;
-                vertical-align: super;
-                line-height: 0;
-            }}
-        """
+    def parse(self, text: str) -> str:
+        """Convert markdown text to HTML"""
+        if not text.strip():
+            return "<p>Start typing to see the preview...</p>"
+        lines = text.split('\n')
+        html_content = cmarkgfm.github_flavored_markdown_to_html(
+            _RE_NATIVE_RAW_LT.sub(_NATIVE_LT, text),
+            options=CmarkOptions.CMARK_OPT_FOOTNOTES | CmarkOptions.CMARK_OPT_SOURCEPOS
+        )
         
-        self.document().setDefaultStyleSheet(style)
-    
-    def update_content(self, markdown_text):
-        """Update the preview with rendered markdown"""
-        if not markdown_text.strip():
-            self.show_empty_message("Markdown")
-            return
-            
-        try:
-            html_content = self.parser.parse(markdown_text)
-            
-            # Wrap in basic HTML structure
-            full_html = f"""
+        # Header ids from the source line, as MarkdownParser makes them
+        def header_tag(match):
+            line = _RE_NATIVE_QUOTE_PREFIX.sub('', lines[int(match.group(2)) - 1])
+            atx = _RE_ATX_HEADER.match(line)
+            title = atx.group(2) if atx else line
+            return f'{_HEADER_TAGS[int(match.group(1))][0]}{_header_slug(title)}">'
+        
+        html_content = _RE_NATIVE_HEADER.sub(header_tag, html_content)
+        html_content = _RE_NATIVE_SOURCEPOS.sub('', html_content)
+        # QTextDocument does not draw form controls
+        html_content = _RE_NATIVE_TASK.sub(lambda match: '☑' if match.group(1) else '☐', html_content)
+        return html_content.replace(_NATIVE_LT, '&lt;')
+
+
+class MarkdownParseSignals(QObject):
+    """
+    Signals for MarkdownParseJob; QRunnable itself cannot emit signals.
+    """
+    finished = pyqtSignal(int, str, object, float)  # generation, html, document, seconds
+    failed = pyqtSignal(int, str)
+
+
+def _wrap_markdown_html(html_content: str) -> str:
+    """Wrap rendered markdown in basic HTML structure"""
+    return f"""
             <!DOCTYPE html>
             <html>
             <head>
@@ -629,18 +792,193 @@ class MarkdownViewer(BasePreviewViewer):
             </body>
             </html>
             """
+
+
+class MarkdownParseJob(QRunnable):
+    """
+    Converts markdown to HTML on a pool thread and lays it out in a fresh
+    QTextDocument there too, so large documents do not block typing.
+    Nothing else may use the parser while the job runs.
+    """
+    def __init__(self, parser, markdown_text: str, generation: int,
+                 style_sheet: str, font, target_thread):
+        super().__init__()
+        self.parser = parser
+        self.markdown_text = markdown_text
+        self.generation = generation
+        self.style_sheet = style_sheet
+        self.font = font
+        self.target_thread = target_thread
+        self.signals = MarkdownParseSignals()
+    
+    def run(self):
+        start = time.perf_counter()
+        try:
+            html_content = self.parser.parse(self.markdown_text)
             
-            self.preserve_scroll_position(lambda: self.setHtml(full_html))
-            
+            # QTextDocument is reentrant: build it here, then hand it over
+            # to the viewer's thread, which only has to swap it in
+            document = QTextDocument()
+            document.setDefaultFont(self.font)
+            document.setDefaultStyleSheet(self.style_sheet)
+            document.setHtml(_wrap_markdown_html(html_content))
+            document.moveToThread(self.target_thread)
         except Exception as e:
-            self.show_error(html.escape(str(e)), "Markdown Parsing Error")
+            self.signals.failed.emit(self.generation, str(e))
+        else:
+            self.signals.finished.emit(
+                self.generation, html_content, document, time.perf_counter() - start
+            )
+
+
+class MarkdownViewer(BasePreviewViewer):
+    """Markdown preview widget with enhanced features"""
+    
+    # Seconds a shown render cost: pool thread parse plus the GUI thread swap
+    render_finished = pyqtSignal(float)
+    
+    def __init__(self, colors):
+        super().__init__(colors)
+        # Parsers belong to the parse jobs; the GUI thread never calls them
+        self.parser = MarkdownParser()
+        self.native_parser = NativeMarkdownParser() if cmarkgfm is not None else None
+        
+        # Recently rendered documents, so undo/redo and repeated states skip parsing
+        self._cache = OrderedDict()
+        self._cache_cap = 8
+        
+        # HTML currently in the document, so edits that render the same
+        # (e.g. trailing whitespace) skip the layout rebuild
+        self._shown_html = None
+        
+        # Documents are parsed on a pool thread, one job at a time; a newer
+        # text waiting behind the running job replaces older ones
+        self._parse_job = None
+        self._queued_text = None
+        self._generation = 0
+        self._force_pending = False
+    
+    def setup_custom_style(self):
+        """Apply markdown-specific styling to the preview"""
+        self.document().setDefaultStyleSheet(_markdown_stylesheet(palette_key(self.colors)))
+    
+    def update_content(self, markdown_text, force=False):
+        """Update the preview with rendered markdown"""
+        # Anything still being parsed is out of date now
+        self._generation += 1
+        self._queued_text = None
+        
+        if not markdown_text.strip():
+            self._shown_html = None
+            self.show_empty_message("Markdown")
+            return
+        
+        self._force_pending = self._force_pending or force
+        html_content = self._cached_html(markdown_text)
+        if html_content is not None:
+            self._show_html(html_content)
+        elif self._parse_job is not None:
+            self._queued_text = markdown_text
+        else:
+            self._start_parse(markdown_text)
+    
+    def _show_html(self, html_content: str, document=None, parse_time=0.0):
+        """Load rendered markdown, swapping in a prebuilt document if given"""
+        start = time.perf_counter()
+        force = self._force_pending
+        self._force_pending = False
+        
+        full_html = _wrap_markdown_html(html_content)
+        if full_html != self._shown_html or force:
+            if document is None:
+                self.preserve_scroll_position(lambda: self.setHtml(full_html))
+            else:
+                self.preserve_scroll_position(lambda: self._swap_document(document))
+            self._shown_html = full_html
+        
+        self.render_finished.emit(parse_time + time.perf_counter() - start)
+    
+    def _swap_document(self, document):
+        """Show a document built by a parse job and drop the one it replaces"""
+        old_document = self.document()
+        document.setParent(self)
+        self.setDocument(document)
+        if old_document.parent() is self:
+            old_document.deleteLater()
+    
+    def _start_parse(self, markdown_text: str):
+        """Hand a document to the thread pool"""
+        parser = self.parser
+        if (self.native_parser is not None and len(markdown_text) >= NATIVE_PARSE_THRESHOLD
+                and self.native_parser.can_parse(markdown_text)):
+            parser = self.native_parser
+        
+        self._parse_job = MarkdownParseJob(
+            parser, markdown_text, self._generation,
+            self.document().defaultStyleSheet(), self.document().defaultFont(), self.thread()
+        )
+        self._parse_job.signals.finished.connect(self._on_parse_finished)
+        self._parse_job.signals.failed.connect(self._on_parse_failed)
+        QThreadPool.globalInstance().start(self._parse_job)
+    
+    def _next_parse(self) -> bool:
+        """Finish the running job and start the queued one, if any"""
+        self._parse_job = None
+        if self._queued_text is None:
+            return False
+        markdown_text = self._queued_text
+        self._queued_text = None
+        self._start_parse(markdown_text)
+        return True
+    
+    def _on_parse_finished(self, generation: int, html_content: str, document, parse_time: float):
+        """Cache the result and show it unless a newer text superseded it"""
+        self._store_html(self._parse_job.markdown_text, html_content)
+        if self._next_parse() or generation != self._generation:
+            return
+        self._show_html(html_content, document, parse_time)
+    
+    def _on_parse_failed(self, generation: int, error_message: str):
+        """Report a document that could not be parsed"""
+        if self._next_parse() or generation != self._generation:
+            return
+        self._shown_html = None
+        self._force_pending = False
+        self.show_error(html.escape(error_message), "Markdown Parsing Error")
+    
+    @staticmethod
+    def _cache_key(markdown_text: str):
+        """Hash plus a length and head guard against hash collisions"""
+        return hash(markdown_text), (len(markdown_text), markdown_text[:32])
+    
+    def _cached_html(self, markdown_text: str):
+        """HTML of a recently seen identical text, or None"""
+        key, guard = self._cache_key(markdown_text)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == guard:
+            self._cache.move_to_end(key)
+            return cached[1]
+        return None
+    
+    def _store_html(self, markdown_text: str, html_content: str):
+        """Remember the HTML rendered for a text"""
+        key, guard = self._cache_key(markdown_text)
+        self._cache[key] = (guard, html_content)
+        if len(self._cache) > self._cache_cap:
+            self._cache.popitem(last=False)
 
 
 class MarkdownPreviewWidget(BasePreviewWidget):
     """Combined widget with splitter for editor and preview"""
     
+    viewer_reports_render_time = True
+    
     def __init__(self, text_edit, colors):
         super().__init__(text_edit, colors, MarkdownViewer)
+    
+    def _render_preview(self, text, force=False):
+        """Let a forced refresh rebuild the document even if the HTML is unchanged"""
+        self.viewer.update_content(text, force=force)
 
 
 def integrate_markdown_viewer(main_window):
@@ -723,4 +1061,4 @@ def toggle_live_preview_callback(main_window):
 def refresh_preview_callback(main_window):
     """Manually refresh the preview"""
     if main_window.preview_widget.preview_visible:
-        main_window.preview_widget._do_update_preview()
\ No newline at end of file
+        main_window.preview_widget._do_update_preview(force=True)
\ No newline at end of file
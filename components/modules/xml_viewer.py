@@ -11,365 +11,654 @@ from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QFont, QColor, QBrush
 import xml.etree.ElementTree as ET
 import xml.dom.minidom as minidom
-import html
+import xml.parsers.expat as expat
+import copy
 import re
+from functools import lru_cache
+from string import Template
 from typing import Optional, Dict, List, Tuple
-from components.base_preview_viewer import BasePreviewViewer, BasePreviewWidget
+from components.base_preview_viewer import BasePreviewViewer, BasePreviewWidget, palette_key
+from utils.syntax_highlighter import XmlHighlighter
 
-class XMLTreeWidget(QTreeWidget):
-    """Tree view widget for XML structure visualization"""
+# Optional libxml2 bindings; minidom is used for formatting without them
+try:
+    from lxml import etree as LET
+except ImportError:
+    LET = None
+
+if LET is not None:
+    # Reused for every preview parse. It decodes the UTF-8 text we pass
+    # regardless of the declared encoding; entities stay unexpanded so a
+    # document cannot pull in local files, and huge_tree lifts size limits
+    _TREE_PARSER = LET.XMLParser(
+        encoding='utf-8', huge_tree=True, resolve_entities=False, collect_ids=False
+    )
+    XML_PARSE_ERRORS = (ET.ParseError, LET.XMLSyntaxError)
+else:
+    XML_PARSE_ERRORS = (ET.ParseError,)
+
+
+def parse_xml(xml_text: str):
+    """Parse XML into an element tree; raises one of XML_PARSE_ERRORS if invalid"""
+    if LET is not None:
+        return LET.fromstring(xml_text.encode('utf-8'), _TREE_PARSER)
+    return ET.fromstring(xml_text)
+
+
+def validate_xml(xml_text: str):
+    """Check that XML is well-formed without building it; raises ET.ParseError if not"""
+    # Expat with no handlers registered never calls back into Python
+    parser = expat.ParserCreate()
+    try:
+        parser.Parse(xml_text, True)
+    except expat.ExpatError as e:
+        # Same error ElementTree raises for the same input
+        error = ET.ParseError(str(e))
+        error.code = e.code
+        error.position = (e.lineno, e.offset)
+        raise error from None
+
+
+def xml_error_line(error):
+    """Line number reported by an XML parse error, or None"""
+    # lxml messages may mention other lines (e.g. of the unclosed tag)
+    # before the error's own, so read the attribute rather than the text
+    if LET is not None and isinstance(error, LET.XMLSyntaxError):
+        return error.lineno
+    position = getattr(error, 'position', None)
+    return position[0] if position else None
+
+
+def iter_elements(root):
+    """Iterate over the elements of a tree, skipping lxml's comment/PI nodes"""
+    if LET is not None:
+        return root.iter(LET.Element)
+    return root.iter()
+
+
+def child_elements(element) -> list:
+    """Element children only; lxml also yields comments and PIs"""
+    return [child for child in element if isinstance(child.tag, str)]
+
+
+# The XML declaration; lxml cannot write one into a unicode string
+_RE_XML_DECLARATION = re.compile(r'\s*(<\?xml\s[^>]*\?>)')
+
+# A tag starting an indented line, seen near the top of the document
+_RE_INDENTED_TAG = re.compile(r'>[ \t]*\r?\n[ \t]+<')
+
+# Part of the document checked for indentation (and line length, at both
+# ends), and the longest line an already formatted document may have
+FORMATTED_HEAD_CHARS = 4096
+FORMATTED_MAX_LINE = 500
+
+# Start of a line longer than FORMATTED_MAX_LINE
+_RE_LONG_LINE = re.compile(r'^[^\n]{%d}' % (FORMATTED_MAX_LINE + 1), re.MULTILINE)
+
+
+def looks_formatted(xml_text: str) -> bool:
+    """Cheap guess whether XML is already indented one element per line"""
+    if not _RE_INDENTED_TAG.search(xml_text, 0, FORMATTED_HEAD_CHARS):
+        return False
+    # Line lengths are sampled at both ends rather than over the whole text
+    tail = max(0, len(xml_text) - FORMATTED_HEAD_CHARS)
+    return not (_RE_LONG_LINE.search(xml_text, 0, FORMATTED_HEAD_CHARS)
+                or _RE_LONG_LINE.search(xml_text, tail))
+
+
+def pretty_print_xml(xml_text: str, root=None) -> str:
+    """
+    Indent XML two spaces per level; raises one of XML_PARSE_ERRORS if invalid.
+    With lxml, a root already returned by parse_xml() for the same text is
+    copied and re-indented instead of parsing again; the root itself is left
+    untouched. Text that is already indented is returned as it is once
+    validated.
+    """
+    if looks_formatted(xml_text):
+        if root is None:
+            parse_xml(xml_text)
+        return xml_text
     
-    def __init__(self, colors):
-        super().__init__()
-        self.colors = colors
-        self.setup_style()
-        
-        # Configure tree
-        self.setHeaderLabels(['Element', 'Attributes', 'Text Content'])
-        self.setAlternatingRowColors(True)
-        self.setAnimated(True)
-        self.setExpandsOnDoubleClick(True)
-        self.setRootIsDecorated(True)
-        self.setUniformRowHeights(True)
-        self.setSortingEnabled(False)
-        
-        # Configure header
-        header = self.header()
-        header.setStretchLastSection(True)
-        header.setDefaultSectionSize(200)
-        header.resizeSection(0, 200)  # Element column
-        header.resizeSection(1, 250)  # Attributes column
-        
-    def setup_style(self):
-        """Apply VS Code-inspired styling to the tree view"""
-        style = f"""
-            QTreeWidget {{
-                background-color: {self.colors["black"]};
-                color: {self.colors["white"]};
+    if LET is not None:
+        if root is None:
+            root = parse_xml(xml_text)
+        # The whole document keeps the DOCTYPE and top-level comments/PIs;
+        # the tree view shares the root, so indent a copy
+        tree = copy.deepcopy(root.getroottree())
+        LET.indent(tree, space="  ")
+        pretty_xml = LET.tostring(tree, encoding='unicode')
+        declaration = _RE_XML_DECLARATION.match(xml_text)
+        if declaration:
+            pretty_xml = f"{declaration.group(1)}\n{pretty_xml}"
+        return pretty_xml
+    
+    # Parse to validate, so errors match the tree view's
+    ET.fromstring(xml_text)
+    pretty_xml = minidom.parseString(xml_text).toprettyxml(indent="  ")
+    
+    # Remove extra blank lines that minidom adds
+    return '\n'.join([line for line in pretty_xml.split('\n') if line.strip()])
+
+
+# Children shown per element before the rest wait behind a "more" item
+CHILD_BATCH_SIZE = 200
+
+# A live update patches the existing tree in place unless it has to add or
+# remove more than this share of the items it walks (and at least
+# PATCH_MIN_CHANGES of them), in which case a full rebuild is cheaper
+PATCH_MAX_CHANGE_RATIO = 0.3
+PATCH_MIN_CHANGES = 100
+
+# Quiet period after the last edit before the live preview updates
+LIVE_UPDATE_DEBOUNCE_MS = 150
+
+
+_TREE_STYLE = Template("""
+            QTreeWidget {
+                background-color: $black;
+                color: $white;
                 border: none;
                 font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
                 font-size: 13px;
                 outline: none;
-                alternate-background-color: {self.colors["gray1"]};
-                gridline-color: {self.colors["gray3"]};
+                alternate-background-color: $gray1;
+                gridline-color: $gray3;
                 show-decoration-selected: 1;
-            }}
+            }
             
-            QTreeWidget::item {{
+            QTreeWidget::item {
                 padding: 4px 6px;
                 border: none;
                 height: 20px;
-                color: {self.colors["white"]};
-            }}
-            
-            QTreeWidget::item:alternate {{
-                background-color: {self.colors["gray1"]};
-                color: {self.colors["white"]};
-            }}
-            
-            QTreeWidget::item:hover {{
-                background-color: {self.colors["hover"]};
-                color: {self.colors["white"]};
-            }}
-            
-            QTreeWidget::item:selected {{
-                background-color: {self.colors["selection"]};
-                color: {self.colors["white"]};
-            }}
-            
-            QTreeWidget::item:selected:hover {{
-                background-color: {self.colors["selection"]};
-                color: {self.colors["white"]};
-            }}
-            
-            QTreeWidget::branch:has-siblings:!adjoins-item {{
+                color: $white;
+            }
+            
+            QTreeWidget::item:alternate {
+                background-color: $gray1;
+                color: $white;
+            }
+            
+            QTreeWidget::item:hover {
+                background-color: $hover;
+                color: $white;
+            }
+            
+            QTreeWidget::item:selected {
+                background-color: $selection;
+                color: $white;
+            }
+            
+            QTreeWidget::item:selected:hover {
+                background-color: $selection;
+                color: $white;
+            }
+            
+            QTreeWidget::branch:has-siblings:!adjoins-item {
                 border-image: none;
                 border: none;
-            }}
+            }
             
-            QTreeWidget::branch:has-siblings:adjoins-item {{
+            QTreeWidget::branch:has-siblings:adjoins-item {
                 border-image: none;
                 border: none;
-            }}
+            }
             
-            QTreeWidget::branch:!has-children:!has-siblings:adjoins-item {{
+            QTreeWidget::branch:!has-children:!has-siblings:adjoins-item {
                 border-image: none;
                 border: none;
-            }}
+            }
             
             QTreeWidget::branch:has-children:!has-siblings:closed,
-            QTreeWidget::branch:closed:has-children:has-siblings {{
+            QTreeWidget::branch:closed:has-children:has-siblings {
                 image: none;
                 border-image: none;
-            }}
+            }
             
             QTreeWidget::branch:open:has-children:!has-siblings,
-            QTreeWidget::branch:open:has-children:has-siblings {{
+            QTreeWidget::branch:open:has-children:has-siblings {
                 image: none;
                 border-image: none;
-            }}
+            }
             
-            QHeaderView::section {{
-                background-color: {self.colors["gray2"]};
-                color: {self.colors["white"]};
+            QHeaderView::section {
+                background-color: $gray2;
+                color: $white;
                 padding: 8px 6px;
                 border: none;
-                border-right: 1px solid {self.colors["gray3"]};
-                border-bottom: 1px solid {self.colors["gray3"]};
+                border-right: 1px solid $gray3;
+                border-bottom: 1px solid $gray3;
                 font-weight: bold;
                 font-size: 12px;
-            }}
+            }
             
-            QHeaderView::section:hover {{
-                background-color: {self.colors["gray3"]};
-            }}
+            QHeaderView::section:hover {
+                background-color: $gray3;
+            }
             
-            QScrollBar:vertical {{
-                background: {self.colors["black"]};
+            QScrollBar:vertical {
+                background: $black;
                 width: 14px;
                 border: none;
                 border-radius: 2px;
-            }}
+            }
             
-            QScrollBar::handle:vertical {{
-                background: {self.colors["gray3"]};
+            QScrollBar::handle:vertical {
+                background: $gray3;
                 min-height: 30px;
                 border: none;
                 border-radius: 2px;
                 margin: 2px;
-            }}
+            }
             
-            QScrollBar::handle:vertical:hover {{
-                background: {self.colors["gray4"]};
-            }}
+            QScrollBar::handle:vertical:hover {
+                background: $gray4;
+            }
             
             QScrollBar::add-line:vertical,
-            QScrollBar::sub-line:vertical {{
+            QScrollBar::sub-line:vertical {
                 background: none;
                 border: none;
                 height: 0px;
-            }}
+            }
             
             QScrollBar::add-page:vertical,
-            QScrollBar::sub-page:vertical {{
+            QScrollBar::sub-page:vertical {
                 background: none;
-            }}
+            }
+        """)
+
+_TAB_STYLE = Template("""
+            QTabWidget::pane {
+                border: 1px solid $gray3;
+                border-top: none;
+                background-color: $black;
+            }
+            
+            QTabBar::tab {
+                background-color: $gray2;
+                color: $gray4;
+                padding: 8px 16px;
+                margin-right: 1px;
+                border: 1px solid $gray3;
+                border-bottom: none;
+                border-top-left-radius: 2px;
+                border-top-right-radius: 2px;
+                min-width: 80px;
+            }
+            
+            QTabBar::tab:selected {
+                background-color: $black;
+                color: $white;
+                border-bottom: 1px solid $black;
+            }
+            
+            QTabBar::tab:hover:!selected {
+                background-color: $hover;
+                color: $white;
+            }
+            
+            QTabBar::tab:first {
+                margin-left: 0px;
+            }
+        """)
+
+_FORMATTED_DOCUMENT_STYLE = """
+            body {
+                font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
+                font-size: 13px;
+                line-height: 1.4;
+                padding: 10px;
+                margin: 0;
+            }
+        """
+
+_FORMATTED_WIDGET_STYLE = """
+            QTextBrowser {
+                font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
+                font-size: 13px;
+            }
         """
-        self.setStyleSheet(style)
+
+
+@lru_cache(maxsize=4)
+def _tree_stylesheet(colors_key):
+    """Tree view stylesheet, built once per palette"""
+    return _TREE_STYLE.substitute(dict(colors_key))
+
+
+@lru_cache(maxsize=4)
+def _tab_stylesheet(colors_key):
+    """Tree/Formatted tab bar stylesheet, built once per palette"""
+    return _TAB_STYLE.substitute(dict(colors_key))
+
+
+
+class XMLTreeWidget(QTreeWidget):
+    """Tree view widget for XML structure visualization"""
+    
+    def __init__(self, colors):
+        super().__init__()
+        self.colors = colors
+        self.setup_style()
+        
+        # "N more" placeholder items, keyed by the id stored in their data, map
+        # to the placeholder, the sibling elements it stands for and the first
+        # one not yet shown
+        self._pending = {}
+        self._next_pending_id = 0
+        self._new_placeholders = []
+        # Items created so far; lets a patch tell how much it had to build
+        self._items_built = 0
+        self.itemExpanded.connect(self._on_item_expanded)
+        
+        # Column brushes, shared by every item
+        self._brush_tag = QBrush(QColor(colors["blue"]))
+        self._brush_attr = QBrush(QColor(colors["green"]))
+        self._brush_text = QBrush(QColor(colors["white"]))
+        self._brush_empty = QBrush(QColor(colors["gray4"]))
+        
+        # Configure tree
+        self.setHeaderLabels(['Element', 'Attributes', 'Text Content'])
+        self.setAlternatingRowColors(True)
+        self.setAnimated(True)
+        self.setExpandsOnDoubleClick(True)
+        self.setRootIsDecorated(True)
+        self.setUniformRowHeights(True)
+        self.setSortingEnabled(False)
+        
+        # Configure header
+        header = self.header()
+        header.setStretchLastSection(True)
+        header.setDefaultSectionSize(200)
+        header.resizeSection(0, 200)  # Element column
+        header.resizeSection(1, 250)  # Attributes column
+        
+    def setup_style(self):
+        """Apply VS Code-inspired styling to the tree view"""
+        self.setStyleSheet(_tree_stylesheet(palette_key(self.colors)))
     
     def populate_from_element(self, element: ET.Element, parent_item: Optional[QTreeWidgetItem] = None):
-        """Recursively populate tree from XML element"""
+        """Populate tree from XML element, depth-first without recursion"""
+        root_item = None
+        # Reversed pushes keep document order; deep documents cannot hit
+        # Python's recursion limit
+        stack = [(element, parent_item)]
+        
+        while stack:
+            element, parent_item = stack.pop()
+            if element is None:
+                # Marker pushed below the children, so it comes after them
+                self._add_placeholder(*parent_item)
+                continue
+            
+            item, children = self._create_item(element, parent_item)
+            if root_item is None:
+                root_item = item
+            
+            # Very wide elements only get their first children for now
+            if len(children) > CHILD_BATCH_SIZE:
+                stack.append((None, (item, children, CHILD_BATCH_SIZE)))
+                children = children[:CHILD_BATCH_SIZE]
+            
+            for child in reversed(children):
+                stack.append((child, item))
+        
+        return root_item
+    
+    def _add_placeholder(self, parent_item: QTreeWidgetItem, children: list, start: int):
+        """Add an expandable item standing in for children[start:]"""
+        placeholder = QTreeWidgetItem(parent_item)
+        placeholder.setText(0, f"… {len(children) - start} more, expand to load")
+        placeholder.setForeground(0, self._brush_empty)
+        placeholder.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+        
+        pending_id = self._next_pending_id
+        self._next_pending_id += 1
+        placeholder.setData(0, Qt.ItemDataRole.UserRole, pending_id)
+        self._pending[pending_id] = (placeholder, children, start)
+        self._new_placeholders.append(placeholder)
+    
+    def _expand_new_items(self, expand):
+        """Expand freshly built items, leaving the new placeholders collapsed"""
+        signals_blocked = self.blockSignals(True)
+        try:
+            expand()
+            for placeholder in self._new_placeholders:
+                placeholder.setExpanded(False)
+        finally:
+            self._new_placeholders = []
+            self.blockSignals(signals_blocked)
+    
+    def _on_item_expanded(self, item: QTreeWidgetItem):
+        """Load more children when a placeholder is expanded"""
+        pending_id = item.data(0, Qt.ItemDataRole.UserRole)
+        if pending_id in self._pending:
+            # Not from inside the expand signal, since the item gets removed
+            QTimer.singleShot(0, lambda: self._load_pending(item, pending_id))
+    
+    def _load_pending(self, item: QTreeWidgetItem, pending_id: int):
+        """Replace a placeholder with the next batch of children"""
+        # A rebuild in the meantime drops the entry (and deletes the item)
+        if pending_id not in self._pending:
+            return
+        _, children, start = self._pending.pop(pending_id)
+        parent_item = item.parent()
+        
+        self.setUpdatesEnabled(False)
+        try:
+            parent_item.removeChild(item)
+            end = start + CHILD_BATCH_SIZE
+            new_items = [self.populate_from_element(child, parent_item) for child in children[start:end]]
+            if end < len(children):
+                self._add_placeholder(parent_item, children, end)
+            
+            def expand():
+                for new_item in new_items:
+                    self.expandRecursively(self.indexFromItem(new_item))
+            self._expand_new_items(expand)
+        finally:
+            self.setUpdatesEnabled(True)
+    
+    def _create_item(self, element, parent_item: Optional[QTreeWidgetItem]):
+        """Create the tree item for one element; returns it with the child elements"""
         # Create tree item
         if parent_item is None:
             item = QTreeWidgetItem(self)
         else:
             item = QTreeWidgetItem(parent_item)
         
+        self._items_built += 1
+        
+        children = child_elements(element)
+        tag, attrs, text, text_brush = self._element_columns(element, children)
+        
         # Set element name with color
-        item.setText(0, element.tag)
-        item.setForeground(0, QBrush(QColor(self.colors["blue"])))
+        item.setText(0, tag)
+        item.setForeground(0, self._brush_tag)
         
         # Set attributes
-        if element.attrib:
-            if len(element.attrib) == 1:
-                # Single attribute - show inline
-                key, value = next(iter(element.attrib.items()))
-                item.setText(1, f'{key}="{value}"')
-            elif len(element.attrib) <= 3:
-                # Few attributes - show on one line
-                attrs = []
-                for key, value in element.attrib.items():
-                    attrs.append(f'{key}="{value}"')
-                item.setText(1, ' '.join(attrs))
-            else:
-                # Many attributes - show count
-                item.setText(1, f'{len(element.attrib)} attributes')
-            item.setForeground(1, QBrush(QColor(self.colors["green"])))
+        if attrs:
+            item.setText(1, attrs)
+            item.setForeground(1, self._brush_attr)
         
         # Set text content
+        if text:
+            item.setText(2, text)
+            item.setForeground(2, text_brush)
+        
+        return item, children
+    
+    def _element_columns(self, element, children: list):
+        """Column texts for an element, plus the brush for its text column"""
+        attrib = element.attrib
+        if not attrib:
+            attrs = ''
+        elif len(attrib) <= 3:
+            # Few attributes - show on one line
+            attrs = ' '.join(f'{key}="{value}"' for key, value in attrib.items())
+        else:
+            # Many attributes - show count
+            attrs = f'{len(attrib)} attributes'
+        
         if element.text and element.text.strip():
-            text_preview = element.text.strip()
             # Replace newlines and tabs with spaces for display
-            text_preview = ' '.join(text_preview.split())
-            if len(text_preview) > 60:
-                text_preview = text_preview[:60] + "..."
-            item.setText(2, text_preview)
-            item.setForeground(2, QBrush(QColor(self.colors["white"])))
-        elif len(list(element)) == 0:
+            text = ' '.join(element.text.split())
+            if len(text) > 60:
+                text = text[:60] + "..."
+            return element.tag, attrs, text, self._brush_text
+        if not children:
             # Empty element
-            item.setText(2, "〈empty〉")
-            item.setForeground(2, QBrush(QColor(self.colors["gray4"])))
-        
-        # Add icon based on element type
-        if len(list(element)):  # Has children
-            item.setExpanded(True)
-        
-        # Recursively add children
-        for child in element:
-            self.populate_from_element(child, item)
-        
-        return item
+            return element.tag, attrs, "〈empty〉", self._brush_empty
+        return element.tag, attrs, '', self._brush_text
+    
+    def _update_item(self, item: QTreeWidgetItem, element, children: list):
+        """Bring an existing item's columns up to date, touching only changed ones"""
+        tag, attrs, text, text_brush = self._element_columns(element, children)
+        if item.text(0) != tag:
+            item.setText(0, tag)
+        if item.text(1) != attrs:
+            item.setText(1, attrs)
+            item.setForeground(1, self._brush_attr)
+        if item.text(2) != text:
+            item.setText(2, text)
+            item.setForeground(2, text_brush)
+    
+    def _patch_document(self, root) -> bool:
+        """
+        Update the current tree in place to show root, walking items and
+        elements in lockstep. Returns False if the tree needs a full rebuild.
+        """
+        if self.topLevelItemCount() != 1:
+            return False
+        top_item = self.topLevelItem(0)
+        if top_item.text(0) != root.tag:
+            return False
+        
+        built_before = self._items_built
+        visited = removed = 0
+        new_items = []
+        opened = []
+        stack = [(top_item, root)]
+        
+        while stack:
+            item, element = stack.pop()
+            visited += 1
+            children = child_elements(element)
+            self._update_item(item, element, children)
+            
+            shown = item.childCount()
+            if shown and item.child(shown - 1).data(0, Qt.ItemDataRole.UserRole) is not None:
+                # Re-added below if still needed; the stale entry is pruned
+                item.takeChild(shown - 1)
+                shown -= 1
+            
+            # Keep children the user already loaded past the first batch
+            target = min(len(children), max(shown, CHILD_BATCH_SIZE))
+            
+            for index in range(min(shown, target)):
+                stack.append((item.child(index), children[index]))
+            
+            if shown > target:
+                for index in range(shown - 1, target - 1, -1):
+                    item.takeChild(index)
+                removed += shown - target
+            elif target > shown:
+                if not shown:
+                    opened.append(item)
+                new_items.extend(self.populate_from_element(child, item) for child in children[shown:target])
+            
+            if len(children) > target:
+                self._add_placeholder(item, children, target)
+            
+            changed = removed + self._items_built - built_before
+            if changed > PATCH_MIN_CHANGES and changed > visited * PATCH_MAX_CHANGE_RATIO:
+                return False
+        
+        # Drop "more" entries whose placeholder is no longer in the tree
+        self._pending = {
+            pending_id: entry for pending_id, entry in self._pending.items()
+            if entry[0].treeWidget() is self
+        }
+        
+        def expand():
+            for opened_item in opened:
+                opened_item.setExpanded(True)
+            for new_item in new_items:
+                self.expandRecursively(self.indexFromItem(new_item))
+        self._expand_new_items(expand)
+        return True
+    
+    def show_document(self, root):
+        """
+        Show the given document. Small edits patch the current tree in place;
+        otherwise it is rebuilt fully expanded.
+        """
+        # One repaint and no per-item signals while thousands of items are added
+        self.setUpdatesEnabled(False)
+        self.blockSignals(True)
+        try:
+            if not self._patch_document(root):
+                self.clear_tree()
+                self.populate_from_element(root)
+                # A single pass instead of expanding each item as it is created
+                self._expand_new_items(self.expandAll)
+        finally:
+            self.blockSignals(False)
+            self.setUpdatesEnabled(True)
     
     def clear_tree(self):
         """Clear all items from the tree"""
         self.clear()
+        self._pending.clear()
+        self._new_placeholders = []
 
 
 class XMLFormattedView(BasePreviewViewer):
     """Formatted XML text view with syntax highlighting"""
     
     def __init__(self, colors):
+        # Attached to the document only while it holds formatted XML
+        self.highlighter = XmlHighlighter(None, colors)
         super().__init__(colors)
         self.setOpenExternalLinks(False)
     
     def setup_custom_style(self):
         """Apply XML-specific styling"""
-        style = f"""
-            body {{
-                font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
-                font-size: 13px;
-                line-height: 1.4;
-                padding: 10px;
-                margin: 0;
-            }}
-            
-            /* XML syntax highlighting */
-            .xml-tag {{
-                color: {self.colors["blue"]};
-            }}
-            
-            .xml-attribute {{
-                color: {self.colors["green"]};
-            }}
-            
-            .xml-value {{
-                color: {self.colors["green"]};  /* One Dark string color */
-            }}
-            
-            .xml-text {{
-                color: {self.colors["white"]};
-            }}
-            
-            .xml-comment {{
-                color: {self.colors["gray4"]};  /* One Dark comment color */
-                font-style: italic;
-            }}
-            
-            .xml-cdata {{
-                color: {self.colors["orange"]};  /* One Dark preprocessor color */
-                background-color: {self.colors["gray2"]};
-                padding: 2px 4px;
-                border-radius: 2px;
-            }}
-            
-            .xml-declaration {{
-                color: {self.colors["purple"]};  /* One Dark keyword color */
-            }}
-            
-            pre {{
-                margin: 0;
-                white-space: pre-wrap;
-                word-wrap: break-word;
-            }}
-        """
-        
-        self.document().setDefaultStyleSheet(style)
+        # Formatted XML is plain text coloured by XmlHighlighter; the document
+        # stylesheet only covers the HTML empty and error messages
+        self.document().setDefaultStyleSheet(_FORMATTED_DOCUMENT_STYLE)
+        # Plain text takes the widget font, so make it monospace here too
+        self.setStyleSheet(self.styleSheet() + _FORMATTED_WIDGET_STYLE)
+        self.document().setDocumentMargin(10)
     
-    def update_content(self, xml_text: str):
-        """Display XML with syntax highlighting"""
+    def update_content(self, xml_text: str, root=None):
+        """Display XML with syntax highlighting, reusing a parse_xml() root if given"""
         if not xml_text.strip():
             self.show_empty_message("XML")
             return
             
         try:
-            # Parse to validate
-            root = ET.fromstring(xml_text)
-            
-            # Pretty print the XML
-            dom = minidom.parseString(xml_text)
-            pretty_xml = dom.toprettyxml(indent="  ")
-            
-            # Remove extra blank lines that minidom adds
-            pretty_xml = '\n'.join([line for line in pretty_xml.split('\n') if line.strip()])
-            
-            # Apply syntax highlighting
-            highlighted = self._highlight_xml(pretty_xml)
-            
-            # Wrap in HTML
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="utf-8">
-            </head>
-            <body>
-                <pre>{highlighted}</pre>
-            </body>
-            </html>
-            """
-            
-            self.preserve_scroll_position(lambda: self.setHtml(html_content))
-            
-        except ET.ParseError as e:
+            # Pretty print the XML (this also validates it)
+            pretty_xml = pretty_print_xml(xml_text, root)
+            
+            # Plain text skips Qt's HTML parser; the highlighter colours it
+            self.highlighter.setDocument(self.document())
+            self.preserve_scroll_position(lambda: self.setPlainText(pretty_xml))
+            
+        except XML_PARSE_ERRORS as e:
             self.show_error(f"XML Parse Error: {str(e)}", "XML Parse Error")
         except Exception as e:
             self.show_error(f"Error: {str(e)}", "XML Error")
     
-    def _highlight_xml(self, xml_text: str) -> str:
-        """Apply syntax highlighting to XML text"""
-        # Escape HTML first
-        xml_text = html.escape(xml_text)
-        
-        # XML declaration
-        xml_text = re.sub(
-            r'(&lt;\?xml.*?\?&gt;)',
-            r'<span class="xml-declaration">\1</span>',
-            xml_text,
-            flags=re.DOTALL
-        )
-        
-        # Comments
-        xml_text = re.sub(
-            r'(&lt;!--.*?--&gt;)',
-            r'<span class="xml-comment">\1</span>',
-            xml_text,
-            flags=re.DOTALL
-        )
-        
-        # CDATA sections
-        xml_text = re.sub(
-            r'(&lt;!\[CDATA\[.*?\]\]&gt;)',
-            r'<span class="xml-cdata">\1</span>',
-            xml_text,
-            flags=re.DOTALL
-        )
-        
-        # Tags with attributes
-        def highlight_tag(match):
-            full_tag = match.group(0)
-            tag_start = match.group(1)  # < or </
-            tag_name = match.group(2)   # tag name
-            attributes = match.group(3)  # attributes
-            tag_end = match.group(4)    # > or />
-            
-            # Highlight attributes
-            if attributes:
-                attributes = re.sub(
-                    r'(\w+)(=)(&quot;[^&]*&quot;|&#39;[^&]*&#39;)',
-                    r'<span class="xml-attribute">\1</span>\2<span class="xml-value">\3</span>',
-                    attributes
-                )
-            
-            return f'<span class="xml-tag">{tag_start}{tag_name}</span>{attributes}<span class="xml-tag">{tag_end}</span>'
-        
-        # Match opening and closing tags
-        xml_text = re.sub(
-            r'(&lt;/?)([\w:.-]+)([^&gt;]*?)(/&gt;|&gt;)',
-            highlight_tag,
-            xml_text
-        )
-        
-        return xml_text
+    def show_empty_message(self, file_type: str):
+        """Show the empty state without XML colouring"""
+        self.highlighter.setDocument(None)
+        super().show_empty_message(file_type)
+    
+    def show_error(self, error_message: str, error_type: str = "Error"):
+        """Show an error message without XML colouring"""
+        self.highlighter.setDocument(None)
+        super().show_error(error_message, error_type)
 
 
 class XMLViewer(QWidget):
@@ -379,6 +668,15 @@ class XMLViewer(QWidget):
         super().__init__()
         self.colors = colors
         self.current_xml = None
+        
+        # Tree of current_xml if it parsed, so validation can skip parsing
+        # the same buffer again
+        self._last_root = None
+        # Per-tag element counts for _last_root, filled on demand
+        self._tag_counts = {}
+        # Set when the formatted tab is behind current_xml because it was
+        # hidden during the last update
+        self._formatted_dirty = False
         self.setup_ui()
     
     def setup_ui(self):
@@ -396,6 +694,7 @@ class XMLViewer(QWidget):
         # Formatted view tab
         self.formatted_view = XMLFormattedView(self.colors)
         self.tab_widget.addTab(self.formatted_view, "Formatted")
+        self.tab_widget.currentChanged.connect(self._on_tab_changed)
         
         # Stats bar
         self.stats_widget = QWidget()
@@ -416,75 +715,58 @@ class XMLViewer(QWidget):
         layout.addWidget(self.stats_widget)
         
         # Style the tab widget
-        self.tab_widget.setStyleSheet(f"""
-            QTabWidget::pane {{
-                border: 1px solid {self.colors["gray3"]};
-                border-top: none;
-                background-color: {self.colors["black"]};
-            }}
-            
-            QTabBar::tab {{
-                background-color: {self.colors["gray2"]};
-                color: {self.colors["gray4"]};
-                padding: 8px 16px;
-                margin-right: 1px;
-                border: 1px solid {self.colors["gray3"]};
-                border-bottom: none;
-                border-top-left-radius: 2px;
-                border-top-right-radius: 2px;
-                min-width: 80px;
-            }}
-            
-            QTabBar::tab:selected {{
-                background-color: {self.colors["black"]};
-                color: {self.colors["white"]};
-                border-bottom: 1px solid {self.colors["black"]};
-            }}
-            
-            QTabBar::tab:hover:!selected {{
-                background-color: {self.colors["hover"]};
-                color: {self.colors["white"]};
-            }}
-            
-            QTabBar::tab:first {{
-                margin-left: 0px;
-            }}
-        """)
+        self.tab_widget.setStyleSheet(_tab_stylesheet(palette_key(self.colors)))
     
     def update_xml(self, xml_text: str):
         """Update all views with new XML content"""
+        stripped = xml_text.strip()
+        
+        # A document always starts and ends with markup. Anything else is
+        # mid-edit: skip the parse and keep showing the last good document,
+        # along with its cached root and any pending formatted view update
+        if stripped and (stripped[0] != '<' or stripped[-1] != '>'):
+            self.error_label.setText("Incomplete XML")
+            self.stats_label.setText("Parse error")
+            return
+        
         self.current_xml = xml_text
+        self._last_root = None
+        self._tag_counts.clear()
         self.error_label.clear()
+        self._formatted_dirty = False
         
-        if not xml_text.strip():
+        if not stripped:
             self.tree_view.clear_tree()
-            self.formatted_view.setHtml(f"<p style='color: {self.colors['gray4']};'>Start typing XML to see the preview...</p>")
+            self.formatted_view.show_empty_message("XML")
             self.stats_label.setText("No XML loaded")
             return
         
         try:
             # Parse XML
-            root = ET.fromstring(xml_text)
+            root = parse_xml(xml_text)
             
             # Update tree view
-            self.tree_view.clear_tree()
-            self.tree_view.populate_from_element(root)
+            self.tree_view.show_document(root)
             
-            # Update formatted view
-            self.formatted_view.update_content(xml_text)
+            # Update formatted view - the costliest part, so only if it is shown
+            if self.tab_widget.currentWidget() is self.formatted_view:
+                self.formatted_view.update_content(xml_text, root)
+            else:
+                self._formatted_dirty = True
             
             # Update stats
             self._update_stats(root)
+            self._last_root = root
             
-        except ET.ParseError as e:
+        except XML_PARSE_ERRORS as e:
             # Show error in formatted view
             self.formatted_view.show_error(str(e), "XML Parse Error")
             self.tree_view.clear_tree()
             
             # Show brief error in status
-            line_match = re.search(r'line (\d+)', str(e))
-            if line_match:
-                self.error_label.setText(f"Error on line {line_match.group(1)}")
+            line = xml_error_line(e)
+            if line:
+                self.error_label.setText(f"Error on line {line}")
             else:
                 self.error_label.setText("Invalid XML")
             
@@ -496,13 +778,36 @@ class XMLViewer(QWidget):
             self.error_label.setText("Error")
             self.stats_label.setText("Error")
     
+    def _on_tab_changed(self, index: int):
+        """Bring the formatted view up to date when its tab is opened"""
+        if self._formatted_dirty and self.tab_widget.widget(index) is self.formatted_view:
+            self._formatted_dirty = False
+            self.formatted_view.update_content(self.current_xml, self._last_root)
+    
+    def cached_root(self, xml_text: str):
+        """Root parsed from exactly this text by the last update, or None"""
+        if self._last_root is not None and xml_text == self.current_xml:
+            return self._last_root
+        return None
+    
+    def _count_by_tag(self, root, tag: str) -> int:
+        """Number of elements called tag ('{uri}name' if namespaced) under root"""
+        # iter(tag) filters inside the parser library rather than in Python
+        if root is not self._last_root:
+            return sum(1 for _ in root.iter(tag))
+        count = self._tag_counts.get(tag)
+        if count is None:
+            count = self._tag_counts[tag] = sum(1 for _ in root.iter(tag))
+        return count
+    
     def _update_stats(self, root: ET.Element):
         """Update statistics about the XML"""
-        # Count elements
-        element_count = len(list(root.iter()))
-        
-        # Count attributes
-        attr_count = sum(len(elem.attrib) for elem in root.iter())
+        # Count elements and attributes in one walk
+        element_count = 0
+        attr_count = 0
+        for elem in iter_elements(root):
+            element_count += 1
+            attr_count += len(elem.attrib)
         
         # Get root info
         root_name = root.tag
@@ -516,10 +821,31 @@ class XMLPreviewWidget(BasePreviewWidget):
     
     def __init__(self, text_edit, colors):
         super().__init__(text_edit, colors, XMLViewer)
+        
+        # Live updates wait for a pause in typing; a parse, tree patch and
+        # reformat per keystroke is wasted on megabyte documents
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(LIVE_UPDATE_DEBOUNCE_MS)
+        self._debounce_timer.timeout.connect(self.update_preview)
+    
+    def _render_preview(self, text, force=False):
+        """Hand the text to the viewer - override for XML's custom method"""
+        self.viewer.update_xml(text)
+    
+    def _connect_text(self):
+        """Render once editor changes pause, rather than on every one"""
+        if self._text_conn is None:
+            self._text_conn = self.text_edit.textChanged.connect(self._restart_debounce)
     
-    def _do_update_preview(self):
-        """Actually perform the preview update - override for XML's custom method"""
-        self.viewer.update_xml(self.text_edit.toPlainText())
+    def _disconnect_text(self):
+        """Stop rendering on editor changes and drop any pending update"""
+        self._debounce_timer.stop()
+        super()._disconnect_text()
+    
+    def _restart_debounce(self):
+        """Push the live update back until typing pauses"""
+        self._debounce_timer.start()
 
 
 def integrate_xml_viewer(main_window):
@@ -562,9 +888,10 @@ def integrate_xml_viewer(main_window):
 
 
 def setup_xml_viewer(main_window):
-    """Set up the XML viewer widget"""
-    # Get current central widget
-    current_central = main_window.centralWidget()
+    """Set up the XML viewer widget, once per window"""
+    # A second widget would also share the editor and render every change
+    if hasattr(main_window, 'xml_preview_widget'):
+        return
     
     # Create XML preview widget
     xml_preview_widget = XMLPreviewWidget(main_window.text_edit, main_window.colors)
@@ -647,18 +974,25 @@ def toggle_preview_callback_xml(main_window):
 
 def validate_xml_callback(main_window):
     """Validate current XML content"""
-    xml_text = main_window.text_edit.toPlainText()
+    # Only copy the document out of Qt once it is known to have content
+    if main_window.text_edit.document().isEmpty():
+        main_window.status_bar.showMessage("No XML content to validate", 3000)
+        return
     
-    if not xml_text.strip():
+    xml_text = main_window.text_edit.toPlainText()
+    if xml_text.isspace():
         main_window.status_bar.showMessage("No XML content to validate", 3000)
         return
     
     try:
-        ET.fromstring(xml_text)
+        # The preview may already have parsed this exact text
+        preview_widget = getattr(main_window, 'xml_preview_widget', None)
+        if preview_widget is None or preview_widget.viewer.cached_root(xml_text) is None:
+            validate_xml(xml_text)
         main_window.status_bar.showMessage("✓ Valid XML", 3000)
-    except ET.ParseError as e:
-        line_match = re.search(r'line (\d+)', str(e))
-        if line_match:
-            main_window.status_bar.showMessage(f"✗ XML Error on line {line_match.group(1)}: {str(e)}", 5000)
+    except XML_PARSE_ERRORS as e:
+        line = xml_error_line(e)
+        if line:
+            main_window.status_bar.showMessage(f"✗ XML Error on line {line}: {str(e)}", 5000)
         else:
             main_window.status_bar.showMessage(f"✗ XML Error: {str(e)}", 5000)
\ No newline at end of file
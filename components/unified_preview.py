@@ -3,9 +3,9 @@ Unified Preview System for Notepad--
 Save this as unified_preview.py in your project directory
 """
 
-import os
+import logging
 from PyQt6.QtWidgets import QWidget, QVBoxLayout
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer, QSignalBlocker
 
 # Preview type registry
 PREVIEW_TYPES = {
@@ -16,17 +16,80 @@ PREVIEW_TYPES = {
     '.htm': ('HTML', 'html'),
 }
 
+# PREVIEW_TYPES as (suffix, types) pairs for matching a lowercased path's end
+_PREVIEW_SUFFIXES = tuple(PREVIEW_TYPES.items())
+
+
+def _markdown_widget_class():
+    import components.modules.markdown_viewer as markdown_viewer
+    return markdown_viewer.MarkdownPreviewWidget
+
+
+def _xml_widget_class():
+    import components.modules.xml_viewer as xml_viewer
+    return xml_viewer.XMLPreviewWidget
+
+
+def _html_widget_class():
+    import components.modules.html_viewer as html_viewer
+    return html_viewer.HTMLPreviewWidget
+
+
+# Widget class factory for each preview type. Each factory imports its module
+# only when the first widget of that type is created, so e.g. Qt WebEngine
+# does not load until an HTML preview is opened. The imports stay plain
+# statements so PyInstaller still finds the modules
+PREVIEW_WIDGETS = {
+    'markdown': _markdown_widget_class,
+    'xml': _xml_widget_class,
+    'html': _html_widget_class,
+}
+
+# File events arriving within this many milliseconds are handled once
+FILE_CHANGE_DELAY_MS = 50
+
+# Paths whose preview type is remembered before the oldest is evicted
+PREVIEW_TYPE_CACHE_SIZE = 256
+
+
+def find_menu(main_window, title):
+    """
+    The window's top-level menu with the given title (e.g. '&View'), or None.
+    The menu bar is indexed on the first call, so it must come after
+    createMenus(); top-level menus added later are not found.
+    """
+    menu_index = getattr(main_window, '_menu_index', None)
+    if menu_index is None:
+        menu_index = main_window._menu_index = {
+            action.text(): action.menu() for action in main_window.menuBar().actions()
+        }
+    return menu_index.get(title)
+
+
 class UnifiedPreviewManager:
     """Manages all preview types and switching between them"""
     
+    __slots__ = (
+        'main_window', 'current_preview_type', 'preview_widgets', 'preview_visible',
+        '_preview_type_cache', 'original_text_edit', '_editor_host',
+        'wrapper_widget', 'wrapper_layout', '_last_preview_type', '_file_change_timer',
+        'preview_action', 'live_preview_action', 'refresh_preview_action',
+        '_live_preview_enabled',
+    )
+    
     def __init__(self, main_window):
         self.main_window = main_window
         self.current_preview_type = None
         self.preview_widgets = {}
         self.preview_visible = False
+        # file path -> (display name, preview type), oldest first
+        self._preview_type_cache = {}
         
         # Store original text edit widget
         self.original_text_edit = main_window.text_edit
+        # Preview widget whose splitter shows the editor; None while it sits
+        # directly in the wrapper
+        self._editor_host = None
         
         # Create wrapper widget that will hold either standalone editor or preview split
         self.wrapper_widget = QWidget()
@@ -37,16 +100,25 @@ class UnifiedPreviewManager:
         # Set wrapper as central widget
         main_window.setCentralWidget(self.wrapper_widget)
         
-        # Create preview action
+        # Coalesces bursts of file events (e.g. save followed by reload);
+        # the first event always updates, whatever the initial file
+        self._last_preview_type = object()
+        self._file_change_timer = QTimer(self.wrapper_widget)
+        self._file_change_timer.setSingleShot(True)
+        self._file_change_timer.setInterval(FILE_CHANGE_DELAY_MS)
+        self._file_change_timer.timeout.connect(self._do_file_changed)
+        
+        # Create preview action; the actions stay None without a View menu
+        self.preview_action = None
+        self.live_preview_action = None
+        self.refresh_preview_action = None
+        # Mirrors the live preview action's check state
+        self._live_preview_enabled = True
         self.create_preview_action()
     
     def create_preview_action(self):
         """Create the preview menu action"""
-        view_menu = None
-        for action in self.main_window.menuBar().actions():
-            if action.text() == '&View':
-                view_menu = action.menu()
-                break
+        view_menu = find_menu(self.main_window, '&View')
         
         if view_menu:
             view_menu.addSeparator()
@@ -60,7 +132,6 @@ class UnifiedPreviewManager:
             )
             self.preview_action.setCheckable(True)
             self.preview_action.setVisible(False)  # Initially hidden
-            self.main_window.preview_action = self.preview_action
             
             # Live preview action
             self.live_preview_action = self.main_window.add_menu_action(
@@ -71,7 +142,8 @@ class UnifiedPreviewManager:
                 checked=True
             )
             self.live_preview_action.setVisible(False)  # Initially hidden
-            self.main_window.live_preview_action = self.live_preview_action
+            # Emitted before triggered, and also for programmatic changes
+            self.live_preview_action.toggled.connect(self._on_live_preview_toggled)
             
             # Refresh preview action
             self.refresh_preview_action = self.main_window.add_menu_action(
@@ -81,15 +153,25 @@ class UnifiedPreviewManager:
                 'F5'
             )
             self.refresh_preview_action.setVisible(False)  # Initially hidden
-            self.main_window.refresh_preview_action = self.refresh_preview_action
     
     def get_preview_type(self, file_path):
         """Get preview type for a file"""
         if not file_path:
             return None, None
         
-        ext = os.path.splitext(file_path)[1].lower()
-        return PREVIEW_TYPES.get(ext, (None, None))
+        # Asked several times per file event for the same path
+        cached = self._preview_type_cache.get(file_path)
+        if cached is not None:
+            return cached
+        
+        path = file_path.lower()
+        result = next(
+            (types for suffix, types in _PREVIEW_SUFFIXES if path.endswith(suffix)), (None, None)
+        )
+        if len(self._preview_type_cache) >= PREVIEW_TYPE_CACHE_SIZE:
+            del self._preview_type_cache[next(iter(self._preview_type_cache))]
+        self._preview_type_cache[file_path] = result
+        return result
     
     def update_preview_action_text(self):
         """Update the preview action text based on current file"""
@@ -103,83 +185,116 @@ class UnifiedPreviewManager:
             self.preview_action.setEnabled(False)
             # Hide preview if no preview available
             if self.preview_visible:
-                self.toggle_preview()
+                self._hide_current()
     
     def get_or_create_preview_widget(self, preview_type):
         """Get existing or create new preview widget for type"""
-        if preview_type not in self.preview_widgets:
-            if preview_type == 'markdown':
-                # Import and create markdown preview
-                import components.modules.markdown_viewer as markdown_viewer
-                preview_widget = markdown_viewer.MarkdownPreviewWidget(
-                    self.original_text_edit, 
-                    self.main_window.colors
-                )
-            elif preview_type == 'xml':
-                # Import and create XML preview
-                import components.modules.xml_viewer as xml_viewer
-                preview_widget = xml_viewer.XMLPreviewWidget(
-                    self.original_text_edit,
-                    self.main_window.colors
-                )
-            elif preview_type == 'html':
-                # Import and create the new, separate HTML preview
-                import components.modules.html_viewer as html_viewer
-                preview_widget = html_viewer.HTMLPreviewWidget(
-                    self.original_text_edit,
-                    self.main_window.colors
-                )
-            else:
+        preview_widget = self.preview_widgets.get(preview_type)
+        if preview_widget is None:
+            widget_class_factory = PREVIEW_WIDGETS.get(preview_type)
+            if widget_class_factory is None:
                 return None
             
+            preview_widget = widget_class_factory()(self.original_text_edit, self.main_window.colors)
+            
+            preview_widget.live_preview_suspended.connect(self.on_live_preview_suspended)
             self.preview_widgets[preview_type] = preview_widget
+            
+            # Added once and then only shown or hidden by toggle_preview
+            self.wrapper_layout.addWidget(preview_widget)
+            preview_widget.setVisible(False)
+            
+            # Creating the widget took the shared editor into its splitter;
+            # give it back until this preview is actually shown
+            self._return_editor()
         
-        return self.preview_widgets[preview_type]
+        return preview_widget
     
-    def toggle_preview(self):
-        """Toggle preview visibility"""
+    def _return_editor(self):
+        """Put the shared editor back where it belongs while no new preview shows it"""
+        if self._editor_host is None:
+            self.wrapper_layout.insertWidget(0, self.original_text_edit)
+        else:
+            self._editor_host.splitter.insertWidget(0, self.original_text_edit)
+    
+    def preload_preview_widgets(self):
+        """Create the current file's preview widget ahead of its first toggle"""
         display_name, preview_type = self.get_preview_type(self.main_window.current_file)
-        
-        if not preview_type:
-            self.preview_action.setChecked(False)
+        if preview_type is None or preview_type in self.preview_widgets:
             return
         
-        # Get or create preview widget
-        preview_widget = self.get_or_create_preview_widget(preview_type)
+        try:
+            self.get_or_create_preview_widget(preview_type)
+        except Exception:
+            # Runs from a timer slot, where an exception would abort the app;
+            # the preview stays unavailable until the user asks for it
+            logging.exception(f"Could not preload the {preview_type} preview")
+            self._return_editor()
+    
+    def toggle_preview(self):
+        """Toggle preview visibility"""
+        if self.preview_visible:
+            self._hide_current()
+        else:
+            display_name, preview_type = self.get_preview_type(self.main_window.current_file)
+            self._show(preview_type)
+    
+    def _hide_current(self):
+        """Hide the visible preview, leaving its editor in place"""
+        preview_widget = self.preview_widgets.get(self.current_preview_type)
+        if preview_widget is not None:
+            if preview_widget.preview_visible:
+                preview_widget.toggle_preview()
+            preview_widget.set_live_preview(False)
+        
+        self.preview_visible = False
+        self.current_preview_type = None
+        self._set_preview_checked(False)
+    
+    def _show(self, preview_type):
+        """Show the preview of the given type in place of any other, in one repaint"""
+        preview_widget = self.get_or_create_preview_widget(preview_type) if preview_type else None
         if not preview_widget:
-            self.preview_action.setChecked(False)
+            self._set_preview_checked(self.preview_visible)
             return
         
-        # Hide current preview if different type
-        if self.current_preview_type and self.current_preview_type != preview_type:
-            current_widget = self.preview_widgets.get(self.current_preview_type)
-            if current_widget and current_widget.preview_visible:
-                current_widget.toggle_preview()
-        
-        # Switch to the correct preview widget
-        # Remove all widgets from wrapper layout
-        while self.wrapper_layout.count():
-            child = self.wrapper_layout.takeAt(0)
-            if child.widget():
-                child.widget().setParent(None)
-        
-        # Add the new preview widget
-        self.wrapper_layout.addWidget(preview_widget)
-        
-        # Toggle preview
-        self.preview_visible = preview_widget.toggle_preview()
-        self.current_preview_type = preview_type if self.preview_visible else None
+        # Switch to the correct preview widget, repainting once
+        self.wrapper_widget.setUpdatesEnabled(False)
+        try:
+            if self.current_preview_type != preview_type:
+                self._hide_current()
+            
+            # The shared editor moves into the splitter of the shown widget
+            if self._editor_host is not preview_widget:
+                preview_widget.splitter.insertWidget(0, self.original_text_edit)
+                self._editor_host = preview_widget
+            for widget in self.preview_widgets.values():
+                widget.setVisible(widget is preview_widget)
+            
+            if not preview_widget.preview_visible:
+                preview_widget.toggle_preview()
+        finally:
+            self.wrapper_widget.setUpdatesEnabled(True)
         
-        # Update action state
-        self.preview_action.setChecked(self.preview_visible)
+        self.preview_visible = True
+        self.current_preview_type = preview_type
+        self._set_preview_checked(True)
         
-        # Update live preview
-        if self.live_preview_action.isChecked():
-            preview_widget.set_live_preview(self.preview_visible)
+        # Update live preview; an unchecked action keeps the widget manual
+        preview_widget.set_live_preview(self._live_preview_enabled)
+    
+    def _set_preview_checked(self, checked):
+        """Sync the preview action's check mark without emitting its signals"""
+        with QSignalBlocker(self.preview_action):
+            self.preview_action.setChecked(checked)
+    
+    def _on_live_preview_toggled(self, checked):
+        """Keep the live preview mirror in step with the action"""
+        self._live_preview_enabled = checked
     
     def toggle_live_preview(self):
         """Toggle live preview mode"""
-        enabled = self.live_preview_action.isChecked()
+        enabled = self._live_preview_enabled
         
         if self.current_preview_type:
             preview_widget = self.preview_widgets.get(self.current_preview_type)
@@ -190,26 +305,43 @@ class UnifiedPreviewManager:
                 if enabled and preview_widget.preview_visible:
                     preview_widget.update_preview()
     
+    def on_live_preview_suspended(self):
+        """A render stalled the editor, so the preview widget turned live preview off"""
+        self.live_preview_action.setChecked(False)
+        self.main_window.status_bar.showMessage(
+            "Live preview paused: rendering is too slow. Press F5 to refresh.", 5000
+        )
+    
     def refresh_preview(self):
         """Manually refresh the preview"""
         if self.current_preview_type:
             preview_widget = self.preview_widgets.get(self.current_preview_type)
             if preview_widget and preview_widget.preview_visible:
-                preview_widget._do_update_preview()
+                preview_widget._do_update_preview(force=True)
     
-    def on_file_changed(self):
-        """Called when a new file is opened or file type changes"""
+    def on_file_changed(self, *signal_args):
+        """Called when a new file is opened or file type changes (signal arguments are unused)"""
+        self._file_change_timer.start()
+    
+    def _do_file_changed(self):
+        """Update the preview for the current file once a burst of file events settles"""
+        preview_type = self.get_preview_type(self.main_window.current_file)
+        
+        # Same kind of file as last time - action text and preview still fit
+        if preview_type == self._last_preview_type:
+            return
+        self._last_preview_type = preview_type
+        display_name, new_preview_type = preview_type
+        
         self.update_preview_action_text()
         
-        # If preview is visible and file type changed, update preview
-        if self.preview_visible:
-            display_name, new_preview_type = self.get_preview_type(self.main_window.current_file)
-            
-            if new_preview_type != self.current_preview_type:
-                # Toggle off current preview and toggle on new one
-                self.toggle_preview()  # Hide current
-                if new_preview_type:  # Show new if available
-                    self.toggle_preview()
+        # If preview is still visible and file type changed, switch previews
+        if self.preview_visible and new_preview_type != self.current_preview_type:
+            self._show(new_preview_type)
+        else:
+            # Build this file's preview once the file is up, so the first
+            # toggle does not wait for it
+            QTimer.singleShot(0, self.preload_preview_widgets)
 
 
 def integrate_unified_preview(main_window):
@@ -220,61 +352,51 @@ def integrate_unified_preview(main_window):
     # Create preview manager
     main_window.preview_manager = UnifiedPreviewManager(main_window)
     
-    # Hook into file operations to update preview action text
-    original_new_file = main_window.new_file
-    original_on_file_loaded = main_window.on_file_loaded
-    original_on_file_saved = main_window.on_file_saved
-    
-    def new_file_with_preview():
-        original_new_file()
-        main_window.preview_manager.on_file_changed()
-    
-    def on_file_loaded_with_preview(content, encoding):
-        original_on_file_loaded(content, encoding)
-        main_window.preview_manager.on_file_changed()
-    
-    def on_file_saved_with_preview(file_path, encoding):
-        original_on_file_saved(file_path, encoding)
-        main_window.preview_manager.on_file_changed()
-    
-    # Replace methods
-    main_window.new_file = new_file_with_preview
-    main_window.on_file_loaded = on_file_loaded_with_preview
-    main_window.on_file_saved = on_file_saved_with_preview
+    # Update the preview action and preview whenever the open file changes
+    preview_manager = main_window.preview_manager
+    main_window.fileNew.connect(preview_manager.on_file_changed)
+    main_window.fileOpened.connect(preview_manager.on_file_changed)
+    main_window.fileSaved.connect(preview_manager.on_file_changed)
     
     # Initial update
     main_window.preview_manager.update_preview_action_text()
+    
+    # Build the preview widget for a file opened at startup once the window
+    # is up; later files are handled by on_file_changed
+    QTimer.singleShot(0, main_window.preview_manager.preload_preview_widgets)
 
 
 def validate_xml_unified(main_window):
     """Validate current XML content (works with unified preview)"""
-    import xml.etree.ElementTree as ET
-    import re
+    from components.modules.xml_viewer import validate_xml, xml_error_line, XML_PARSE_ERRORS
     
-    xml_text = main_window.text_edit.toPlainText()
+    # Only copy the document out of Qt once it is known to have content
+    if main_window.text_edit.document().isEmpty():
+        main_window.status_bar.showMessage("No XML content to validate", 3000)
+        return
     
-    if not xml_text.strip():
+    xml_text = main_window.text_edit.toPlainText()
+    if xml_text.isspace():
         main_window.status_bar.showMessage("No XML content to validate", 3000)
         return
     
     try:
-        ET.fromstring(xml_text)
+        # The preview may already have parsed this exact text
+        preview_widget = main_window.preview_manager.preview_widgets.get('xml')
+        if preview_widget is None or preview_widget.viewer.cached_root(xml_text) is None:
+            validate_xml(xml_text)
         main_window.status_bar.showMessage("✓ Valid XML", 3000)
-    except ET.ParseError as e:
-        line_match = re.search(r'line (\d+)', str(e))
-        if line_match:
-            main_window.status_bar.showMessage(f"✗ XML Error on line {line_match.group(1)}: {str(e)}", 5000)
+    except XML_PARSE_ERRORS as e:
+        line = xml_error_line(e)
+        if line:
+            main_window.status_bar.showMessage(f"✗ XML Error on line {line}: {str(e)}", 5000)
         else:
             main_window.status_bar.showMessage(f"✗ XML Error: {str(e)}", 5000)
 
 
 def add_xml_validation_menu(main_window):
     """Add XML validation menu item"""
-    view_menu = None
-    for action in main_window.menuBar().actions():
-        if action.text() == '&View':
-            view_menu = action.menu()
-            break
+    view_menu = find_menu(main_window, '&View')
     
     if view_menu:
         # Add at the end of view menu
@@ -1,5 +1,6 @@
 import sys
 import os
+import io
 import platform
 import time
 import logging
@@ -7,6 +8,7 @@ import codecs
 from datetime import datetime
 from pathlib import Path
 from functools import partial
+from operator import attrgetter
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QTextEdit, QFileDialog, QMessageBox, QStatusBar,
     QVBoxLayout, QWidget, QMenuBar, QMenu, QFontDialog, QLabel, QDialog,
@@ -16,12 +18,12 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtGui import (
     QAction, QFont, QColor, QPalette, QFontMetrics, QKeySequence, QPainter,
     QTextFormat, QTextCursor, QTextDocument, QIcon, QDesktopServices, QActionGroup,
-    QPageLayout, QPen, QPixmap, QBrush
+    QPageLayout, QPen, QPixmap, QBrush, QStaticText, QTransform
 )
 from PyQt6.QtCore import (
     Qt, QSize, QSettings, QTimer, QThread, QObject, pyqtSignal, QRect, QPoint,
     QFileInfo, QDir, QUrl, QStandardPaths, QFile, QTextStream, QIODevice, QChar,
-    QMarginsF
+    QMarginsF, QEvent
 )
 from PyQt6.QtPrintSupport import QPrinter, QPrintDialog
 from PyQt6.QtSvg import QSvgRenderer
@@ -40,10 +42,12 @@ BACKUP_INTERVAL_MS = 30_000
 AUTOSAVE_INTERVAL_MS = 300_000
 STATS_UPDATE_INTERVAL_MS = 400
 MAX_RECENT_FILES = 10
+LINE_NUMBER_CACHE_SIZE = 256  # Shaped line number strings kept for repainting
 DEFAULT_ENCODING = 'utf-8'
 BACKUP_DIR_NAME = "backups"
 CHUNK_SIZE = 1024 * 1024  # 1MB for file operations
 MAX_TEXT_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+BIG_DOCUMENT_SIZE = 1_000_000  # Characters; above this, highlighting is opt-in
 
 # Common text file extensions
 TEXT_EXTENSIONS = {
@@ -62,12 +66,14 @@ class Icons:
     
     def get_icon(self, svg_str, color="#d4d7dd"):
         """Get cached icon or create new one."""
-        cache_key = f"{svg_str}_{color}"
+        # A tuple key hashes the (interned) strings instead of joining them
+        cache_key = (svg_str, color)
+        icon = self._icon_cache.get(cache_key)
         
-        if cache_key not in self._icon_cache:
-            self._icon_cache[cache_key] = self._create_icon(svg_str, color)
+        if icon is None:
+            icon = self._icon_cache[cache_key] = self._create_icon(svg_str, color)
         
-        return self._icon_cache[cache_key]
+        return icon
     
     @staticmethod
     def _create_icon(svg_str, color="#d4d7dd"):
@@ -177,18 +183,17 @@ def detect_encoding_with_bom(filepath):
     except IOError:
         return None
 
-    # Check BOMs in order of specificity
-    bom_map = {
-        codecs.BOM_UTF32_LE: 'utf-32-le',
-        codecs.BOM_UTF32_BE: 'utf-32-be',
-        codecs.BOM_UTF16_LE: 'utf-16-le',
-        codecs.BOM_UTF16_BE: 'utf-16-be',
-        codecs.BOM_UTF8: 'utf-8-sig',
-    }
-    
-    for bom_marker, encoding in bom_map.items():
-        if bom.startswith(bom_marker):
-            return encoding
+    # UTF-32-LE's BOM starts with UTF-16-LE's, so it is checked first
+    if bom.startswith(codecs.BOM_UTF32_LE):
+        return 'utf-32-le'
+    if bom.startswith(codecs.BOM_UTF32_BE):
+        return 'utf-32-be'
+    if bom.startswith(codecs.BOM_UTF16_LE):
+        return 'utf-16-le'
+    if bom.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16-be'
+    if bom.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
     return None
 
 # --- File Worker for Background Operations ---
@@ -218,21 +223,26 @@ class FileWorker(QObject):
         """Saves content to file with progress reporting."""
         logging.info(f"Saving '{self.file_path}' with encoding '{self.encoding}'")
         
-        # Pre-calculate total size for progress
-        total_bytes = len(self.content_to_save.encode(self.encoding, errors='replace'))
-        bytes_written = 0
+        content = self.content_to_save
+        total_chars = len(content)
+        # Encodes each chunk once; stateful, so a BOM is only written at the start
+        encoder = codecs.getincrementalencoder(self.encoding)(errors='replace')
+        # Text mode would write '\n' as the platform line separator
+        translate_newlines = os.linesep != '\n'
         
-        with open(self.file_path, 'w', encoding=self.encoding, errors='replace') as f:
-            for i in range(0, len(self.content_to_save), CHUNK_SIZE):
+        with open(self.file_path, 'wb') as f:
+            for i in range(0, total_chars, CHUNK_SIZE):
                 if not self._is_running:
                     raise InterruptedError("Save cancelled")
                     
-                chunk = self.content_to_save[i:i + CHUNK_SIZE]
-                f.write(chunk)
-                bytes_written += len(chunk.encode(self.encoding, errors='replace'))
+                chunk = content[i:i + CHUNK_SIZE]
+                if translate_newlines:
+                    chunk = chunk.replace('\n', os.linesep)
+                f.write(encoder.encode(chunk))
                 
-                progress = int((bytes_written / total_bytes) * 100) if total_bytes > 0 else 100
-                self.progress.emit(progress)
+                chars_written = min(i + CHUNK_SIZE, total_chars)
+                self.progress.emit(int((chars_written / total_chars) * 100))
+            f.write(encoder.encode('', final=True))
         
         self.finished.emit("", self.encoding)
 
@@ -244,20 +254,26 @@ class FileWorker(QObject):
         content = []
         bytes_read = 0
         
-        with open(self.file_path, 'r', encoding=self.encoding, errors='replace') as f:
+        # Decode the bytes as read, translating newlines like text mode does
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(self.encoding)(errors='replace'), translate=True
+        )
+        
+        with open(self.file_path, 'rb') as f:
             while True:
                 if not self._is_running:
                     raise InterruptedError("Load cancelled")
                     
-                chunk = f.read(CHUNK_SIZE)
-                if not chunk:
+                data = f.read(CHUNK_SIZE)
+                if not data:
                     break
                     
-                content.append(chunk)
-                bytes_read += len(chunk.encode(self.encoding, errors='replace'))
+                content.append(decoder.decode(data))
+                bytes_read += len(data)
                 
                 progress = int((bytes_read / file_size) * 100) if file_size > 0 else 100
                 self.progress.emit(progress)
+            content.append(decoder.decode(b'', final=True))
         
         self.finished.emit(''.join(content), self.encoding)
 
@@ -266,17 +282,47 @@ class FileWorker(QObject):
 
 # --- Line Number Area Widget ---
 class LineNumberArea(QWidget):
+    CURRENT_LINE_COLOR = QColor("#c6c6c6")  # Bright gray for current line
+    OTHER_LINE_COLOR = QColor("#858585")  # Muted gray for other lines
+
     def __init__(self, editor):
         super().__init__(editor)
         self.editor = editor
+        # Width per number of digits for the current font
+        self._width_cache = {}
+        # Pre-shaped line numbers, oldest first
+        self._static_cache = {}
 
     def sizeHint(self):
         return QSize(self.calculate_width(), 0)
 
     def calculate_width(self):
         digits = len(str(max(1, self.editor.blockCount())))
-        # Extra space for modified indicator
-        return self.fontMetrics().horizontalAdvance('9' * digits) + 30
+        width = self._width_cache.get(digits)
+        if width is None:
+            # Extra space for modified indicator
+            width = self._width_cache[digits] = self.fontMetrics().horizontalAdvance('9' * digits) + 30
+        return width
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.Type.FontChange:
+            # Zooming changes the digit widths
+            self._width_cache.clear()
+            self._static_cache.clear()
+            if not self.isHidden():
+                self.editor.update_line_numbers()
+        super().changeEvent(event)
+
+    def static_number(self, number):
+        """Return a QStaticText for number, shaping it only the first time."""
+        static = self._static_cache.get(number)
+        if static is None:
+            if len(self._static_cache) >= LINE_NUMBER_CACHE_SIZE:
+                del self._static_cache[next(iter(self._static_cache))]
+            static = QStaticText(number)
+            static.prepare(QTransform(), self.font())
+            self._static_cache[number] = static
+        return static
 
     def paintEvent(self, event):
         painter = QPainter(self)
@@ -289,38 +335,61 @@ class LineNumberArea(QWidget):
             painter.setBrush(QColor("#f48771"))  # VS Code orange-red
             painter.drawEllipse(6, 6, 4, 4)  # Smaller, more subtle
         
-        block = self.editor.firstVisibleBlock()
-        top = int(self.editor.blockBoundingGeometry(block).translated(self.editor.contentOffset()).top())
-        bottom = top + int(self.editor.blockBoundingRect(block).height())
+        editor = self.editor
+        block = editor.firstVisibleBlock()
+        top = int(editor.blockBoundingGeometry(block).translated(editor.contentOffset()).top())
+        block_rect = editor.blockBoundingRect
+        bottom = top + int(block_rect(block).height())
         
         # Current line highlighting
-        current_line = self.editor.textCursor().blockNumber()
-        
-        while block.isValid() and top <= event.rect().bottom():
-            if block.isVisible() and bottom >= event.rect().top():
-                number = str(block.blockNumber() + 1)
+        current_line = editor.textCursor().blockNumber()
+        
+        # Blocks are walked in order, so count along instead of asking each one
+        block_number = block.blockNumber()
+        
+        # Everything below is fixed for the whole paint, so look it up once
+        rect = event.rect()
+        rect_top = rect.top()
+        rect_bottom = rect.bottom()
+        right = self.width() - 8
+        static_number = self.static_number
+        draw_text = painter.drawStaticText
+        painter.setFont(self.font())
+        painter.setPen(self.OTHER_LINE_COLOR)
+        
+        while block.isValid() and top <= rect_bottom:
+            if block.isVisible() and bottom >= rect_top:
+                number = static_number(str(block_number + 1))
+                # Right-align against the margin
+                x = right - int(number.size().width())
                 
                 # VS Code style current line highlighting
-                if block.blockNumber() == current_line:
-                    painter.setPen(QColor("#c6c6c6"))  # Bright gray for current line
-                    painter.setFont(self.font())  # No bold font
+                if block_number == current_line:
+                    painter.setPen(self.CURRENT_LINE_COLOR)
+                    draw_text(x, top, number)
+                    painter.setPen(self.OTHER_LINE_COLOR)
                 else:
-                    painter.setPen(QColor("#858585"))  # Muted gray for other lines
-                    painter.setFont(self.font())
-                
-                painter.drawText(0, top, self.width() - 8, self.fontMetrics().height(),
-                            Qt.AlignmentFlag.AlignRight, number)
+                    draw_text(x, top, number)
             
             block = block.next()
+            block_number += 1
             top = bottom
-            bottom = top + int(self.editor.blockBoundingRect(block).height())
+            bottom = top + int(block_rect(block).height())
 
 class TextEditWithLineNumbers(QPlainTextEdit):
     def __init__(self):
         super().__init__()
+        self._line_number_width = None  # width last applied to the margin
         self.lineNumberArea = LineNumberArea(self)
         self.line_number_color = QColor(Qt.GlobalColor.gray)
         
+        # Current line highlight, reused for every cursor move
+        self._line_selection = QTextEdit.ExtraSelection()
+        # One Dark style current line highlight - very subtle
+        lineColor = QColor("#2c313c")  # Slightly lighter than background
+        self._line_selection.format.setBackground(lineColor)
+        self._line_selection.format.setProperty(QTextFormat.Property.FullWidthSelection, True)
+        
         # Enable smooth scrolling by adjusting scroll bar
         self.verticalScrollBar().setSingleStep(20)
         
@@ -332,8 +401,13 @@ class TextEditWithLineNumbers(QPlainTextEdit):
         self.highlight_current_line()
 
     def update_line_numbers(self):
-        self.setViewportMargins(self.lineNumberArea.calculate_width(), 0, 0, 0)
-        self.lineNumberArea.setFixedWidth(self.lineNumberArea.calculate_width())
+        width = self.lineNumberArea.calculate_width()
+        # Most block count changes keep the digit count
+        if width == self._line_number_width:
+            return
+        self._line_number_width = width
+        self.setViewportMargins(width, 0, 0, 0)
+        self.lineNumberArea.setFixedWidth(width)
 
     def update_line_number_area(self, rect, dy):
         if dy:
@@ -348,22 +422,49 @@ class TextEditWithLineNumbers(QPlainTextEdit):
                                              self.lineNumberArea.width(), cr.height()))
 
     def highlight_current_line(self):
-        selections = []
-        if not self.isReadOnly():
-            selection = QTextEdit.ExtraSelection()
-            # One Dark style current line highlight - very subtle
-            lineColor = QColor("#2c313c")  # Slightly lighter than background
-            selection.format.setBackground(lineColor)
-            selection.format.setProperty(QTextFormat.Property.FullWidthSelection, True)
-            selection.cursor = self.textCursor()
-            selection.cursor.clearSelection()
-            selections.append(selection)
-        self.setExtraSelections(selections)
+        if self.isReadOnly():
+            self.setExtraSelections([])
+            return
+        # Only the cursor changes between calls
+        cursor = self.textCursor()
+        cursor.clearSelection()
+        self._line_selection.cursor = cursor
+        self.setExtraSelections([self._line_selection])
 
 
     def showLineNumbers(self, show):
         self.lineNumberArea.setVisible(show)
-        self.update_line_numbers() if show else self.setViewportMargins(0, 0, 0, 0)
+        if show:
+            self.update_line_numbers()
+        else:
+            self._line_number_width = None
+            self.setViewportMargins(0, 0, 0, 0)
+
+# --- Menu Tables ---
+# (text, slot path on the Notepad window, shortcut, icon); None is a separator
+FILE_ACTIONS = [
+    ('&New', 'new_file', QKeySequence.StandardKey.New, Icons.NEW_FILE),
+    ('&Open...', 'open_file', QKeySequence.StandardKey.Open, Icons.OPEN_FILE),
+]
+
+SAVE_ACTIONS = [
+    ('&Save', 'save_file', QKeySequence.StandardKey.Save, Icons.SAVE),
+    ('Save &As...', 'save_file_as', QKeySequence.StandardKey.SaveAs, Icons.SAVE),
+]
+
+EDIT_ACTIONS = [
+    ('&Undo', 'text_edit.undo', QKeySequence.StandardKey.Undo, Icons.UNDO),
+    ('&Redo', 'text_edit.redo', QKeySequence.StandardKey.Redo, Icons.REDO),
+    None,
+    ('Cu&t', 'text_edit.cut', QKeySequence.StandardKey.Cut, Icons.CUT),
+    ('&Copy', 'text_edit.copy', QKeySequence.StandardKey.Copy, Icons.COPY),
+    ('&Paste', 'text_edit.paste', QKeySequence.StandardKey.Paste, Icons.PASTE),
+    None,
+    ('&Find...', 'show_find_dialog', QKeySequence.StandardKey.Find, Icons.FIND),
+    ('&Replace...', 'show_replace_dialog', QKeySequence.StandardKey.Replace, Icons.REPLACE),
+    None,
+    ('Select &All', 'text_edit.selectAll', QKeySequence.StandardKey.SelectAll, None),
+]
 
 # --- Main Application ---
 class Notepad(QMainWindow):
@@ -383,7 +484,13 @@ class Notepad(QMainWindow):
         self.file_worker = None
         self._is_busy = False
         self.current_highlighter = None
+        # Set while highlighting is off only because the open file is big
+        self._big_document = False
         self._last_find_params = {}
+        # Recent files as last read from/written to settings, and as listed
+        # in the Open Recent menu
+        self._recent_files = None
+        self._recent_menu_files = None
         
         # Cache for file info to avoid repeated I/O
         self._cached_file_size = None
@@ -476,30 +583,18 @@ class Notepad(QMainWindow):
 
     def createMenus(self):
         menu_bar = self.menuBar()
+        icon_color = self.colors["icon"]
         
         # File menu with cached icons
         file_menu = menu_bar.addMenu('&File')
-        
-        new_action = self.add_menu_action(file_menu, '&New', self.new_file, 
-                                         QKeySequence.StandardKey.New)
-        new_action.setIcon(self.icons.get_icon(Icons.NEW_FILE, self.colors["icon"]))
-        
-        open_action = self.add_menu_action(file_menu, '&Open...', self.open_file, 
-                                          QKeySequence.StandardKey.Open)
-        open_action.setIcon(self.icons.get_icon(Icons.OPEN_FILE, self.colors["icon"]))
+        self.build_menu(file_menu, FILE_ACTIONS, icon_color)
         
         self.recent_menu = file_menu.addMenu("Open Recent")
         self.recent_menu.aboutToShow.connect(self.populate_recent_files)
         
         file_menu.addSeparator()
         
-        self.save_action = self.add_menu_action(file_menu, '&Save', self.save_file, 
-                                               QKeySequence.StandardKey.Save)
-        self.save_action.setIcon(self.icons.get_icon(Icons.SAVE, self.colors["icon"]))
-        
-        save_as_action = self.add_menu_action(file_menu, 'Save &As...', self.save_file_as, 
-                                             QKeySequence.StandardKey.SaveAs)
-        save_as_action.setIcon(self.icons.get_icon(Icons.SAVE, self.colors["icon"]))
+        self.save_action, _ = self.build_menu(file_menu, SAVE_ACTIONS, icon_color)
         
         file_menu.addSeparator()
         
@@ -511,49 +606,14 @@ class Notepad(QMainWindow):
         
         print_action = self.add_menu_action(file_menu, '&Print...', self.print_document, 
                                            QKeySequence.StandardKey.Print)
-        print_action.setIcon(self.icons.get_icon(Icons.PRINT, self.colors["icon"]))
+        print_action.setIcon(self.icons.get_icon(Icons.PRINT, icon_color))
         
         file_menu.addSeparator()
         self.add_menu_action(file_menu, 'E&xit', self.close, QKeySequence.StandardKey.Quit)
         
         # Edit menu with cached icons
         edit_menu = menu_bar.addMenu('&Edit')
-        
-        undo_action = self.add_menu_action(edit_menu, '&Undo', self.text_edit.undo, 
-                                          QKeySequence.StandardKey.Undo)
-        undo_action.setIcon(self.icons.get_icon(Icons.UNDO, self.colors["icon"]))
-        
-        redo_action = self.add_menu_action(edit_menu, '&Redo', self.text_edit.redo, 
-                                          QKeySequence.StandardKey.Redo)
-        redo_action.setIcon(self.icons.get_icon(Icons.REDO, self.colors["icon"]))
-        
-        edit_menu.addSeparator()
-        
-        cut_action = self.add_menu_action(edit_menu, 'Cu&t', self.text_edit.cut, 
-                                         QKeySequence.StandardKey.Cut)
-        cut_action.setIcon(self.icons.get_icon(Icons.CUT, self.colors["icon"]))
-        
-        copy_action = self.add_menu_action(edit_menu, '&Copy', self.text_edit.copy, 
-                                          QKeySequence.StandardKey.Copy)
-        copy_action.setIcon(self.icons.get_icon(Icons.COPY, self.colors["icon"]))
-        
-        paste_action = self.add_menu_action(edit_menu, '&Paste', self.text_edit.paste, 
-                                           QKeySequence.StandardKey.Paste)
-        paste_action.setIcon(self.icons.get_icon(Icons.PASTE, self.colors["icon"]))
-        
-        edit_menu.addSeparator()
-        
-        find_action = self.add_menu_action(edit_menu, '&Find...', self.show_find_dialog, 
-                                          QKeySequence.StandardKey.Find)
-        find_action.setIcon(self.icons.get_icon(Icons.FIND, self.colors["icon"]))
-        
-        replace_action = self.add_menu_action(edit_menu, '&Replace...', self.show_replace_dialog, 
-                                             QKeySequence.StandardKey.Replace)
-        replace_action.setIcon(self.icons.get_icon(Icons.REPLACE, self.colors["icon"]))
-        
-        edit_menu.addSeparator()
-        self.add_menu_action(edit_menu, 'Select &All', self.text_edit.selectAll, 
-                            QKeySequence.StandardKey.SelectAll)
+        self.build_menu(edit_menu, EDIT_ACTIONS, icon_color)
         
         # Format menu
         format_menu = menu_bar.addMenu('F&ormat')
@@ -561,7 +621,7 @@ class Notepad(QMainWindow):
                                                self.toggle_word_wrap, shortcut="Alt+Z", checkable=True)
         
         font_action = self.add_menu_action(format_menu, '&Font...', self.choose_font)
-        font_action.setIcon(self.icons.get_icon(Icons.FONT, self.colors["icon"]))
+        font_action.setIcon(self.icons.get_icon(Icons.FONT, icon_color))
         
         format_menu.addSeparator()
         self.syntax_action = self.add_menu_action(format_menu, 'S&yntax Highlighting', 
@@ -608,6 +668,20 @@ class Notepad(QMainWindow):
         help_menu = menu_bar.addMenu('&Help')
         self.add_menu_action(help_menu, '&About', self.show_about)
 
+    def build_menu(self, menu, spec, icon_color):
+        """Add the actions described by a menu table to menu and return them."""
+        actions = []
+        for entry in spec:
+            if entry is None:
+                menu.addSeparator()
+                continue
+            text, slot_path, shortcut, icon = entry
+            action = self.add_menu_action(menu, text, attrgetter(slot_path)(self), shortcut)
+            if icon:
+                action.setIcon(self.icons.get_icon(icon, icon_color))
+            actions.append(action)
+        return actions
+
     def add_menu_action(self, menu, text, slot, shortcut=None, checkable=False, checked=False):
         action = QAction(text, self)
         if shortcut:
@@ -843,9 +917,11 @@ class Notepad(QMainWindow):
         self.autosave_timer = QTimer(self)
         self.autosave_timer.timeout.connect(self.autosave)
         
-        # Stats update timer - Fixed to prevent multiple timers
+        # Stats update timer - runs at most once per interval while typing
+        self._stats_dirty = False
         self.stats_timer = QTimer(self)
         self.stats_timer.setSingleShot(True)
+        self.stats_timer.setInterval(STATS_UPDATE_INTERVAL_MS)
         self.stats_timer.timeout.connect(self.update_stats)
 
     # --- File Operations ---
@@ -859,6 +935,7 @@ class Notepad(QMainWindow):
             self.text_edit.document().setModified(False)
             self.update_title()
             self.file_type_label.setText("Plain Text")
+            self.set_big_document(False)
             self.update_menu_visibility()  # Update menu visibility for new file
             self.fileNew.emit()
 
@@ -952,6 +1029,12 @@ class Notepad(QMainWindow):
         # Reset stylesheet
         self.text_edit.setStyleSheet("")
         
+        # Detach the old highlighter so setPlainText doesn't re-lex the
+        # whole document synchronously
+        if self.current_highlighter:
+            self.current_highlighter.setDocument(None)
+            self.current_highlighter = None
+        
         self.text_edit.setPlainText(content)
         self.current_file = self.file_worker.file_path
         self.current_encoding = encoding
@@ -960,9 +1043,17 @@ class Notepad(QMainWindow):
         self.text_edit.document().setModified(False)
         self.update_title()
         self.update_recent_files(self.current_file)
-        self.apply_syntax_highlighting()
         self.update_file_type()
-        self.status_bar.showMessage(f"Loaded {os.path.basename(self.current_file)}", 3000)
+        if len(content) < BIG_DOCUMENT_SIZE:
+            self.set_big_document(False)
+            QTimer.singleShot(0, self.apply_syntax_highlighting)
+            self.status_bar.showMessage(f"Loaded {os.path.basename(self.current_file)}", 3000)
+        else:
+            # Big document: leave highlighting off until the user asks for it
+            self.set_big_document(True)
+            self.status_bar.showMessage(
+                f"Loaded {os.path.basename(self.current_file)} "
+                "(large file, syntax highlighting disabled)", 5000)
         self.fileOpened.emit(self.current_file, encoding)
 
     def on_file_saved(self, file_path, encoding):
@@ -1154,6 +1245,9 @@ class Notepad(QMainWindow):
         self.cursor_label.setText(f"Ln {line}, Col {col}")
 
     def update_stats(self):
+        if not self._stats_dirty:
+            return
+        self._stats_dirty = False
         text = self.text_edit.toPlainText()
         words = len(text.split()) if text else 0
         chars = len(text)
@@ -1205,14 +1299,13 @@ class Notepad(QMainWindow):
         
         # Update preview menu visibility
         supports_preview = self.supports_preview()
-        if hasattr(self, 'preview_action'):
-            self.preview_action.setVisible(supports_preview)
-        
-        if hasattr(self, 'live_preview_action'):
-            self.live_preview_action.setVisible(supports_preview)
-            
-        if hasattr(self, 'refresh_preview_action'):
-            self.refresh_preview_action.setVisible(supports_preview)
+        preview_manager = getattr(self, 'preview_manager', None)
+        if preview_manager is not None:
+            for action in (preview_manager.preview_action,
+                           preview_manager.live_preview_action,
+                           preview_manager.refresh_preview_action):
+                if action is not None:
+                    action.setVisible(supports_preview)
 
     def change_encoding(self, encoding):
         """Fixed to avoid duplicate updates"""
@@ -1229,9 +1322,11 @@ class Notepad(QMainWindow):
                 break
 
     def on_text_changed(self):
-        """Fixed to cancel previous timer before starting new one"""
-        self.stats_timer.stop()  # Cancel any pending update
-        self.stats_timer.start(STATS_UPDATE_INTERVAL_MS)
+        """Mark the stats stale; the running timer picks the change up"""
+        self._stats_dirty = True
+        # Not restarted per keystroke, so stats refresh during long typing too
+        if not self.stats_timer.isActive():
+            self.stats_timer.start()
 
     # --- Features ---
     def toggle_word_wrap(self):
@@ -1255,7 +1350,19 @@ class Notepad(QMainWindow):
         if self.current_file and self.text_edit.document().isModified():
             self.save_file()
 
+    def set_big_document(self, big):
+        """Switch highlighting off for a big file, and back on for the next normal one"""
+        if big:
+            if self.syntax_action.isChecked():
+                self.syntax_action.setChecked(False)
+                self._big_document = True
+        elif self._big_document:
+            self.syntax_action.setChecked(True)
+            self._big_document = False
+
     def toggle_syntax(self):
+        # The user's choice now stands, whatever the file size
+        self._big_document = False
         if self.syntax_action.isChecked():
             self.apply_syntax_highlighting()
         else:
@@ -1388,19 +1495,30 @@ class Notepad(QMainWindow):
 
     # --- Recent Files ---
     def get_recent_files(self):
-        return self.settings.value("recentFiles", [], type=list)[:MAX_RECENT_FILES]
+        # Settings are only read once; every change goes through set_recent_files
+        if self._recent_files is None:
+            self._recent_files = self.settings.value("recentFiles", [], type=list)[:MAX_RECENT_FILES]
+        return list(self._recent_files)
+
+    def set_recent_files(self, recent):
+        self._recent_files = list(recent)
+        self.settings.setValue("recentFiles", self._recent_files)
 
     def update_recent_files(self, file_path):
         recent = self.get_recent_files()
         if file_path in recent:
             recent.remove(file_path)
         recent.insert(0, file_path)
-        self.settings.setValue("recentFiles", recent[:MAX_RECENT_FILES])
+        self.set_recent_files(recent[:MAX_RECENT_FILES])
 
     def populate_recent_files(self):
         """Simplified with partial instead of lambdas"""
-        self.recent_menu.clear()
         recent = self.get_recent_files()
+        # Shown every time the menu opens; rebuild only if the list changed
+        if tuple(recent) == self._recent_menu_files:
+            return
+        self._recent_menu_files = tuple(recent)
+        self.recent_menu.clear()
         
         if not recent:
             action = self.recent_menu.addAction("No Recent Files")
@@ -1426,10 +1544,10 @@ class Notepad(QMainWindow):
             recent = self.get_recent_files()
             if file_path in recent:
                 recent.remove(file_path)
-                self.settings.setValue("recentFiles", recent)
+                self.set_recent_files(recent)
 
     def clear_recent_files(self):
-        self.settings.setValue("recentFiles", [])
+        self.set_recent_files([])
 
     # --- Helpers ---
     def get_last_dir(self, key):
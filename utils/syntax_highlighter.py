@@ -148,6 +148,11 @@ class SyntaxHighlighter(QSyntaxHighlighter):
              # print("Debug: Skipping highlightBlock - formats not ready.")
              return
 
+        if not text:
+            # Nothing to format; just carry any multi-line state through
+            self.setCurrentBlockState(self.previousBlockState())
+            return
+
         applied_range = [False] * len(text)
         start_offset = 0
         current_state = self.previousBlockState()